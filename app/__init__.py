@@ -1,57 +1,82 @@
 import logging
-import os
+import orjson
+from bson import ObjectId
 from flask import Flask
-from pymongo import MongoClient
-from gridfs import GridFS
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS  # Import CORS
+from app.config import JWT_SECRET_KEY, DEFAULT_JWT_SECRET_KEY, JWT_EXPIRATION_HOURS, CORS_MAX_AGE
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson (datetimes are emitted natively as ISO 8601)."""
+
+    @staticmethod
+    def _orjson_default(o):
+        if isinstance(o, ObjectId):
+            return str(o)
+        return DefaultJSONProvider.default(o)
+
+    def _options(self, indent=False):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps_bytes(self, obj, indent=False):
+        return orjson.dumps(obj, default=self._orjson_default, option=self._options(indent))
+
+    def dumps(self, obj, **kwargs):
+        return self.dumps_bytes(obj, indent=bool(kwargs.get('indent'))).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self.dumps_bytes(obj, indent) + b"\n", mimetype=self.mimetype)
+
+class ReplayHubFlask(Flask):
+    json_provider_class = OrjsonProvider
+
+    def make_default_options_response(self):
+        """Answer preflight/OPTIONS with an empty 204 (flask_cors adds the CORS headers)"""
+        response = super().make_default_options_response()
+        response.status_code = 204
+        return response
 
 # Initialize Flask app
-app = Flask(__name__)
+app = ReplayHubFlask(__name__)
 
-# Configure CORS for production
+# Configure CORS for production (also answers preflight requests)
 CORS(app, 
      origins=['*'],  # Allow all origins for now - can be restricted later
      allow_headers=['Content-Type', 'Authorization'],
      methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
-     supports_credentials=True)
+     supports_credentials=True,
+     max_age=CORS_MAX_AGE)
 
 # Configure app
-app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'your-super-secret-jwt-key-change-this-in-production')
-app.config['JWT_EXPIRATION_HOURS'] = int(os.environ.get('JWT_EXPIRATION_HOURS', '24'))
+app.config['JWT_SECRET_KEY'] = JWT_SECRET_KEY
+app.config['JWT_EXPIRATION_HOURS'] = JWT_EXPIRATION_HOURS
 
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[logging.StreamHandler()]
+    handlers=[logging.StreamHandler()],
+    force=True
 )
 logger = logging.getLogger(__name__)
 
+if JWT_SECRET_KEY == DEFAULT_JWT_SECRET_KEY:
+    logger.warning("JWT_SECRET_KEY is not set - using the insecure default secret")
+
 # Import and register authentication blueprint
 from app.auth import auth_bp
 app.register_blueprint(auth_bp)
 
-# Add global CORS headers to all responses
-@app.after_request
-def after_request(response):
-    response.headers['Access-Control-Allow-Origin'] = '*'
-    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
-    response.headers['Access-Control-Max-Age'] = '86400'  # 24 hours
-    return response
-
-# Global OPTIONS handler for preflight requests
-@app.before_request
-def handle_preflight():
-    from flask import request, jsonify
-    if request.method == "OPTIONS":
-        response = jsonify({'status': 'ok'})
-        response.headers['Access-Control-Allow-Origin'] = '*'
-        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
-        response.headers['Access-Control-Max-Age'] = '86400'
-        return response
-
 # Import routes to register them with the app
 from app import routes
 
@@ -1,36 +1,167 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, g
 from functools import wraps
 import jwt
-from datetime import datetime, timedelta
 import os
-from .models import User
+import hashlib
+import threading
+import time
+from cachetools import TTLCache
+from .models import User, DuplicateUserError
+from .config import JWT_ALGORITHM, JWT_SECRET_KEY, PROFILE_PICTURE_MAX_BYTES
 from .utils import allowed_file
-from .s3 import upload_to_s3
-import tempfile
+from .s3 import upload_fileobj_to_s3, generate_presigned_upload, head_s3_object, s3_object_url
+import uuid
 
 # Create authentication blueprint
 auth_bp = Blueprint('auth', __name__)
 
+# Verified tokens: sha256(token)[:16] -> (user_id, user, exp). Entries never
+# outlive the token's own `exp` claim and are dropped when the password changes.
+_token_cache = TTLCache(maxsize=10000, ttl=30)
+_token_cache_lock = threading.Lock()
+
+# Recently rejected tokens: sha256(token)[:16] -> exception class, so clients that
+# keep retrying an expired/invalid token get their 401 without another decode.
+_bad_tokens = TTLCache(maxsize=10000, ttl=60)
+
+def _token_key(token):
+    """Cache key for a raw token (so the bearer token itself isn't kept in memory)"""
+    return hashlib.sha256(token.encode('utf-8')).digest()[:16]
+
+# Decoder, key and algorithms are resolved once at import instead of per request
+_jwt_decoder = jwt.PyJWT(options={'require': ['exp', 'user_id']})
+_JWT_KEY = JWT_SECRET_KEY.encode('utf-8')
+_JWT_ALGS = (JWT_ALGORITHM,)
+
+def _decode_token(token):
+    """Verify a token's signature and claims; the only place tokens are decoded.
+
+    The algorithm list is pinned so a token can never choose its own verifier.
+    """
+    return _jwt_decoder.decode(token, _JWT_KEY, algorithms=_JWT_ALGS)
+
+@auth_bp.before_app_request
+def _parse_authorization_header():
+    """Parse the Authorization header once per request into g.raw_token.
+
+    g.auth_header_malformed is set when the header has no token part.
+    """
+    g.raw_token = None
+    g.auth_header_malformed = False
+    auth_header = request.headers.get('Authorization')
+    if auth_header:
+        parts = auth_header.split(' ')
+        if len(parts) > 1:
+            g.raw_token = parts[1]  # Bearer <token>
+        else:
+            g.auth_header_malformed = True
+
+def _load_user_for_token(user_id, token_version):
+    """Load a token's user and check revocation in a single round trip.
+
+    The user document (minus the password hash) carries token_version, so the
+    same find_one answers both "does the user exist" and "is the token revoked".
+    Raises jwt.InvalidTokenError for a revoked token; returns None for a missing user.
+    """
+    user = User.get_by_id(user_id)
+    if user and token_version != user.token_version:
+        raise jwt.InvalidTokenError('Token has been revoked')
+    return user
+
+def _resolve_token(token):
+    """Decode a JWT and load its user, served from the verification cache when possible.
+
+    Returns (user_id, user); user is None if the account no longer exists.
+    Raises jwt.ExpiredSignatureError / jwt.InvalidTokenError for bad or revoked tokens.
+    """
+    # Several decorators/helpers may resolve the same token within one request
+    resolved = g.get('resolved_token')
+    if resolved and resolved[0] == token:
+        return resolved[1], resolved[2]
+
+    user_id, user = _resolve_token_uncached(token)
+    g.resolved_token = (token, user_id, user)
+    return user_id, user
+
+def _resolve_token_uncached(token):
+    """Resolve a token through the verification cache, decoding it on a miss"""
+    key = _token_key(token)
+    with _token_cache_lock:
+        cached = _token_cache.get(key)
+        rejected = _bad_tokens.get(key)
+    if cached and cached[2] > time.time():
+        return cached[0], cached[1]
+    if rejected:
+        raise rejected('Token was recently rejected')
+
+    try:
+        data = _decode_token(token)
+        user_id = data['user_id']
+        user = _load_user_for_token(user_id, data.get('token_version', 0))
+    except jwt.InvalidTokenError as e:
+        # ExpiredSignatureError is a subclass; remember which one was raised
+        with _token_cache_lock:
+            _bad_tokens[key] = type(e)
+        raise
+
+    exp = data.get('exp')
+    if user and exp:
+        with _token_cache_lock:
+            _token_cache[key] = (user_id, user, exp)
+    return user_id, user
+
+def invalidate_user_tokens(user_id):
+    """Drop every cached token belonging to a user"""
+    user_id = str(user_id)
+    with _token_cache_lock:
+        stale = [key for key, entry in _token_cache.items() if entry[0] == user_id]
+        for key in stale:
+            _token_cache.pop(key, None)
+
+def _upload_profile_picture(file, username):
+    """Stream an uploaded profile picture straight to S3; returns the URL or None"""
+    try:
+        s3_key = f"profile_pictures/{username}_{uuid.uuid4().hex[:12]}{os.path.splitext(file.filename)[1]}"
+        return upload_fileobj_to_s3(file.stream, s3_key, content_type=file.mimetype or None)
+    except Exception as e:
+        current_app.logger.error(f"Profile picture upload failed: {e}")
+        return None
+
+PROFILE_PICTURE_PREFIX = 'profile_pictures/'
+PROFILE_PICTURE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+PRESIGNED_URL_EXPIRY = 300  # seconds
+
+def _request_data():
+    """Form fields for multipart requests, otherwise the JSON body"""
+    if request.form:
+        return request.form
+    return request.get_json(silent=True) or {}
+
+def _profile_picture_from_key(key, user_id):
+    """URL for a profile picture the user already uploaded to S3 via a presigned POST
+
+    Only keys under the user's own prefix that actually exist in the bucket are accepted.
+    """
+    if not key.startswith(f"{PROFILE_PICTURE_PREFIX}{user_id}/") or '..' in key:
+        return None
+    head = head_s3_object(key)
+    if not head or head.get('ContentLength', 0) > PROFILE_PICTURE_MAX_BYTES:
+        return None
+    return s3_object_url(key)
+
 def jwt_required(f):
     """Decorator to require JWT authentication"""
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        auth_header = request.headers.get('Authorization')
-        
-        if auth_header:
-            try:
-                token = auth_header.split(' ')[1]  # Bearer <token>
-            except IndexError:
-                return jsonify({'error': 'Invalid authorization header format'}), 401
+        if g.auth_header_malformed:
+            return jsonify({'error': 'Invalid authorization header format'}), 401
         
+        token = g.raw_token
         if not token:
             return jsonify({'error': 'Authentication token is missing'}), 401
         
         try:
-            data = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
-            current_user_id = data['user_id']
-            current_user = User.get_by_id(current_user_id)
+            current_user_id, current_user = _resolve_token(token)
             if not current_user:
                 return jsonify({'error': 'Invalid token - user not found'}), 401
             
@@ -52,16 +183,11 @@ def optional_jwt(f):
     @wraps(f)
     def decorated(*args, **kwargs):
         current_user = None
-        token = None
-        auth_header = request.headers.get('Authorization')
         
-        if auth_header:
+        if g.raw_token:
             try:
-                token = auth_header.split(' ')[1]  # Bearer <token>
-                data = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
-                current_user_id = data['user_id']
-                current_user = User.get_by_id(current_user_id)
-            except (jwt.ExpiredSignatureError, jwt.InvalidTokenError, IndexError):
+                _, current_user = _resolve_token(g.raw_token)
+            except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
                 # Token is invalid but that's okay for optional auth
                 pass
         
@@ -73,44 +199,27 @@ def optional_jwt(f):
 def register():
     """Register a new user"""
     try:
-        # Handle multipart form data (for profile picture)
-        username = request.form.get('username')
-        email = request.form.get('email')
-        password = request.form.get('password')
-        first_name = request.form.get('first_name', '')
-        last_name = request.form.get('last_name', '')
-        bio = request.form.get('bio', '')
+        # Multipart form data (with profile picture) or JSON; presigned uploads need an
+        # account, so they go through PUT /api/auth/me after registering
+        data = _request_data()
+        username = data.get('username')
+        email = data.get('email')
+        password = data.get('password')
+        first_name = data.get('first_name', '')
+        last_name = data.get('last_name', '')
+        bio = data.get('bio', '')
         
         # Validate required fields
         if not username or not email or not password:
             return jsonify({'error': 'Username, email, and password are required'}), 400
         
-        # Check if user already exists
-        if User.get_by_username(username):
-            return jsonify({'error': 'Username already exists'}), 400
-        
-        if User.get_by_email(email):
-            return jsonify({'error': 'Email already registered'}), 400
-        
         # Handle profile picture upload
         profile_picture_url = None
         if 'profile_picture' in request.files:
             file = request.files['profile_picture']
             if file and file.filename != '' and allowed_file(file.filename):
-                try:
-                    # Save to temporary file
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_file:
-                        file.save(temp_file.name)
-                        
-                        # Upload to S3
-                        s3_key = f"profile_pictures/{username}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{os.path.splitext(file.filename)[1]}"
-                        profile_picture_url = upload_to_s3(temp_file.name, s3_key)
-                        
-                        # Clean up temp file
-                        os.unlink(temp_file.name)
-                        
-                except Exception as e:
-                    current_app.logger.error(f"Profile picture upload failed: {e}")
+                profile_picture_url = _upload_profile_picture(file, username)
+                if not profile_picture_url:
                     return jsonify({'error': 'Failed to upload profile picture'}), 500
         
         # Create new user
@@ -124,7 +233,12 @@ def register():
             'profile_picture': profile_picture_url
         }
         
-        user = User.create(**user_data)
+        try:
+            user = User.create(**user_data)
+        except DuplicateUserError as e:
+            if e.field == 'email':
+                return jsonify({'error': 'Email already registered'}), 400
+            return jsonify({'error': 'Username already exists'}), 400
         if not user:
             return jsonify({'error': 'Failed to create user'}), 500
         
@@ -141,6 +255,39 @@ def register():
         current_app.logger.error(f"Registration error: {e}")
         return jsonify({'error': 'Registration failed'}), 500
 
+@auth_bp.route('/api/auth/profile-picture-url', methods=['POST'])
+@jwt_required
+def profile_picture_upload_url():
+    """Presign a direct-to-S3 upload for the current user's profile picture.
+
+    The client POSTs the image as multipart form data to upload_url, with `fields`
+    first and the file last, and then sends the returned key as
+    profile_picture_key to update profile.
+    """
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename', '')
+    content_type = data.get('content_type', '')
+
+    extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    if extension not in PROFILE_PICTURE_EXTENSIONS:
+        return jsonify({'error': 'Invalid image file type'}), 400
+    if not content_type.startswith('image/'):
+        return jsonify({'error': 'content_type must be an image type'}), 400
+
+    key = f"{PROFILE_PICTURE_PREFIX}{request.current_user_id}/{uuid.uuid4().hex}.{extension}"
+    upload = generate_presigned_upload(key, content_type, PROFILE_PICTURE_MAX_BYTES, PRESIGNED_URL_EXPIRY)
+    if not upload:
+        return jsonify({'error': 'Failed to create upload URL'}), 500
+
+    return jsonify({
+        'upload_url': upload['url'],
+        'fields': upload['fields'],
+        'max_bytes': PROFILE_PICTURE_MAX_BYTES,
+        'key': key,
+        'profile_picture': s3_object_url(key),
+        'expires_in': PRESIGNED_URL_EXPIRY
+    }), 200
+
 @auth_bp.route('/api/auth/login', methods=['POST'])
 def login():
     """Authenticate user and return JWT token"""
@@ -191,30 +338,23 @@ def update_profile():
     """Update current user profile"""
     try:
         current_user = request.current_user
-        # Handle multipart form data (for profile picture)
-        first_name = request.form.get('first_name', current_user.first_name)
-        last_name = request.form.get('last_name', current_user.last_name)
-        bio = request.form.get('bio', current_user.bio)
+        # Multipart form data (with profile picture) or JSON with a presigned upload key
+        data = _request_data()
+        first_name = data.get('first_name', current_user.first_name)
+        last_name = data.get('last_name', current_user.last_name)
+        bio = data.get('bio', current_user.bio)
         
         # Handle profile picture upload
         profile_picture_url = current_user.profile_picture
-        if 'profile_picture' in request.files:
+        if data.get('profile_picture_key'):
+            profile_picture_url = _profile_picture_from_key(data['profile_picture_key'], request.current_user_id)
+            if not profile_picture_url:
+                return jsonify({'error': 'Invalid profile picture key'}), 400
+        elif 'profile_picture' in request.files:
             file = request.files['profile_picture']
             if file and file.filename != '' and allowed_file(file.filename):
-                try:
-                    # Save to temporary file
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_file:
-                        file.save(temp_file.name)
-                        
-                        # Upload to S3
-                        s3_key = f"profile_pictures/{current_user.username}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{os.path.splitext(file.filename)[1]}"
-                        profile_picture_url = upload_to_s3(temp_file.name, s3_key)
-                        
-                        # Clean up temp file
-                        os.unlink(temp_file.name)
-                        
-                except Exception as e:
-                    current_app.logger.error(f"Profile picture upload failed: {e}")
+                profile_picture_url = _upload_profile_picture(file, current_user.username)
+                if not profile_picture_url:
                     return jsonify({'error': 'Failed to upload profile picture'}), 500
         
         # Update user
@@ -254,6 +394,11 @@ def change_password():
         if not current_password or not new_password:
             return jsonify({'error': 'Current password and new password are required'}), 400
         
+        # The cached request user is loaded without its password hash
+        current_user = User.get_by_id(current_user._id, include_password=True)
+        if not current_user:
+            return jsonify({'error': 'User not found'}), 404
+        
         # Verify current password
         if not current_user.check_password(current_password):
             return jsonify({'error': 'Current password is incorrect'}), 400
@@ -261,8 +406,14 @@ def change_password():
         # Update password
         if not current_user.change_password(new_password):
             return jsonify({'error': 'Failed to change password'}), 500
-        
-        return jsonify({'message': 'Password changed successfully'}), 200
+
+        # Tokens issued before the change carry a stale token_version
+        invalidate_user_tokens(current_user._id)
+
+        return jsonify({
+            'message': 'Password changed successfully',
+            'token': current_user.generate_token()
+        }), 200
         
     except Exception as e:
         current_app.logger.error(f"Password change error: {e}")
@@ -272,22 +423,15 @@ def change_password():
 def verify_token():
     """Verify JWT token validity"""
     try:
-        token = None
-        auth_header = request.headers.get('Authorization')
-        
-        if auth_header:
-            try:
-                token = auth_header.split(' ')[1]  # Bearer <token>
-            except IndexError:
-                return jsonify({'error': 'Invalid authorization header format'}), 401
+        if g.auth_header_malformed:
+            return jsonify({'error': 'Invalid authorization header format'}), 401
         
+        token = g.raw_token
         if not token:
             return jsonify({'error': 'Authentication token is missing'}), 401
         
         try:
-            data = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
-            user_id = data['user_id']
-            user = User.get_by_id(user_id)
+            _, user = _resolve_token(token)
             if not user:
                 return jsonify({'error': 'Invalid token - user not found'}), 401
             
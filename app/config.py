@@ -13,10 +13,59 @@ else:
     MONGO_PASSWORD = os.getenv("MONGO_PASSWORD")
     MONGO_URI = f"mongodb://{MONGO_USERNAME}:{MONGO_PASSWORD}@{MONGO_SERVICE_NAME}.{MONGO_NAMESPACE}.svc.cluster.local:{MONGO_PORT}"
 
+# MongoDB connection pool
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 200))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 10))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 3000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 20000))
+# Fail fast instead of piling up requests when the pool is exhausted
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 2000))
+# Wire compression, in order of preference; the server picks the first it supports
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zstd,zlib")
+
+# Unacknowledged (w=0) writes for video metadata inserts: faster, but a failed
+# insert is not reported back to the request
+FAST_METADATA_WRITES = os.getenv("FAST_METADATA_WRITES", "false").lower() == "true"
+# Video metadata inserts from concurrent uploads are coalesced into one insert_many
+# per window (0 disables batching); at most METADATA_BATCH_MAX documents per batch
+METADATA_BATCH_WINDOW_MS = int(os.getenv("METADATA_BATCH_WINDOW_MS", 50))
+METADATA_BATCH_MAX = int(os.getenv("METADATA_BATCH_MAX", 500))
+# Like/dislike counter changes on comments are summed per comment and written with one
+# bulk_write per window (0 writes each change immediately); at most
+# COMMENT_REACTION_BATCH_MAX comments per batch
+COMMENT_REACTION_BATCH_WINDOW_MS = int(os.getenv("COMMENT_REACTION_BATCH_WINDOW_MS", 0))
+COMMENT_REACTION_BATCH_MAX = int(os.getenv("COMMENT_REACTION_BATCH_MAX", 64))
+
+# JWT settings
+DEFAULT_JWT_SECRET_KEY = 'your-super-secret-jwt-key-change-this-in-production'
+JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', DEFAULT_JWT_SECRET_KEY)
+JWT_EXPIRATION_HOURS = int(os.environ.get('JWT_EXPIRATION_HOURS', '24'))
+JWT_ALGORITHM = 'HS256'
+
+# CORS preflight cache lifetime (seconds)
+CORS_MAX_AGE = int(os.getenv('CORS_MAX_AGE', 86400))
+
 UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", "./uploads")
+# Run metadata/thumbnail extraction and the database insert after responding
+# 202 Accepted; clients poll /upload/status/<job_id>
+ASYNC_POST_PROCESSING = os.getenv("ASYNC_POST_PROCESSING", "false").lower() == "true"
+# Largest request body accepted; bigger uploads are refused with 413 before any is read
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 10 * 1024 * 1024 * 1024))
+
+# In-process thumbnail cache (per worker): total size budget, and the largest
+# single thumbnail that is cached rather than streamed from GridFS
+THUMBNAIL_CACHE_BYTES = int(os.getenv("THUMBNAIL_CACHE_BYTES", 128 * 1024 * 1024))
+THUMBNAIL_CACHE_MAX_ITEM_BYTES = int(os.getenv("THUMBNAIL_CACHE_MAX_ITEM_BYTES", 512 * 1024))
 
 # AWS S3 settings
 AWS_ACCESS_KEY = os.environ.get('AWS_ACCESS_KEY', '')
 AWS_SECRET_KEY = os.environ.get('AWS_SECRET_KEY', '')
 S3_BUCKET_NAME = 'replay-hub-storage'
-S3_REGION = 'eu-central-1'
\ No newline at end of file
+S3_REGION = 'eu-central-1'
+# Largest profile picture accepted through a presigned upload
+PROFILE_PICTURE_MAX_BYTES = int(os.getenv("PROFILE_PICTURE_MAX_BYTES", 5 * 1024 * 1024))
+# Threads uploading chunked-upload parts to S3 while the rest of the upload is still arriving
+S3_PART_UPLOAD_WORKERS = int(os.getenv("S3_PART_UPLOAD_WORKERS", 8))
+# Seconds /upload/finalize waits for background part uploads before sending the stragglers itself
+S3_PART_WAIT_TIMEOUT = int(os.getenv("S3_PART_WAIT_TIMEOUT", 300))
\ No newline at end of file
@@ -1,109 +1,598 @@
-from pymongo import MongoClient
+import datetime
+import logging
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future
+from pymongo import MongoClient, IndexModel, ReturnDocument, UpdateOne, ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.write_concern import WriteConcern
 from gridfs import GridFS
 from bson.objectid import ObjectId
-from app.config import MONGO_URI, IS_LOCAL
+from app.config import (
+    MONGO_URI, IS_LOCAL, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS, MONGO_CONNECT_TIMEOUT_MS, MONGO_SOCKET_TIMEOUT_MS,
+    MONGO_WAIT_QUEUE_TIMEOUT_MS, MONGO_COMPRESSORS, FAST_METADATA_WRITES,
+    METADATA_BATCH_WINDOW_MS, METADATA_BATCH_MAX,
+    COMMENT_REACTION_BATCH_WINDOW_MS, COMMENT_REACTION_BATCH_MAX
+)
 from app import logger
 
-# Connect to MongoDB
-try:
-    client = MongoClient(MONGO_URI)
-    db = client.replay_hub
-    fs = GridFS(db)
-    logger.info("Successfully connected to MongoDB")
-except Exception as e:
-    logger.error(f"Failed to connect to MongoDB: {e}")
-    raise
-
-# Select collections based on environment
-collection = db.test_data if IS_LOCAL else db.prod_data
-comments_collection = db.comments
-reactions_collection = db.reactions
-logger.info(f"Using collection: {'test_data' if IS_LOCAL else 'prod_data'}")
-logger.info("Initialized comments and reactions collections")
+_OID_RE = re.compile(r'^[0-9a-fA-F]{24}$')
+
+# A single pooled client per process, created on first use rather than at import
+# time (so forked workers never inherit a client from their parent).
+_client = None
+_client_lock = threading.Lock()
+_handles = {}
+
+def get_client():
+    """Return the process-wide MongoClient, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                try:
+                    client = MongoClient(
+                        MONGO_URI,
+                        maxPoolSize=MONGO_MAX_POOL_SIZE,
+                        minPoolSize=MONGO_MIN_POOL_SIZE,
+                        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+                        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+                        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                        compressors=MONGO_COMPRESSORS,
+                        retryWrites=True,
+                        appname="replay-hub"
+                    )
+                    db = client.replay_hub
+                    _handles['db'] = db
+                    _handles['fs'] = GridFS(db)
+                    # Select collections based on environment
+                    _handles['collection'] = db.test_data if IS_LOCAL else db.prod_data
+                    _handles['comments_collection'] = db.comments
+                    _handles['reactions_collection'] = db.reactions
+                    _handles['upload_jobs_collection'] = db.upload_jobs
+                    _client = client
+                    ensure_indexes(db, _handles['collection'])
+                    logger.info("Successfully connected to MongoDB")
+                    logger.info(f"Using collection: {'test_data' if IS_LOCAL else 'prod_data'}")
+                except Exception as e:
+                    logger.error(f"Failed to connect to MongoDB: {e}")
+                    raise
+    return _client
+
+def ensure_indexes(db, metadata_collection):
+    """Create the indexes behind the hot lookups, once per process (no-op if present)."""
+    indexes = {
+        db.users: [
+            IndexModel([('username', ASCENDING)], unique=True),
+            IndexModel([('email', ASCENDING)], unique=True),
+        ],
+        metadata_collection: [
+            IndexModel([('short_id', ASCENDING)]),
+            IndexModel([('internal_name', ASCENDING)]),
+            IndexModel([('thumbnail_id', ASCENDING)]),
+            # Newest-first pagination of /metadata, optionally per uploader
+            IndexModel([('upload_date', DESCENDING), ('_id', ASCENDING)]),
+            IndexModel([('uploader_id', ASCENDING), ('upload_date', DESCENDING)]),
+            IndexModel([('uploader_username', ASCENDING), ('upload_date', DESCENDING)]),
+            IndexModel([('uploader', ASCENDING), ('upload_date', DESCENDING)]),
+        ],
+        db.comments: [
+            IndexModel([('videoId', ASCENDING), ('parent_comment_id', ASCENDING)]),
+            IndexModel([('parent_comment_id', ASCENDING)]),
+        ],
+        db.reactions: [
+            IndexModel([('videoId', ASCENDING), ('userId', ASCENDING), ('commentId', ASCENDING)]),
+            IndexModel([('commentId', ASCENDING), ('userId', ASCENDING)]),
+        ],
+        db.saved_videos: [
+            IndexModel([('userId', ASCENDING), ('videoId', ASCENDING)]),
+        ],
+        # Thumbnail dedup lookup by content hash
+        db.fs.files: [
+            IndexModel([('metadata.sha256', ASCENDING)]),
+        ],
+        # Finished or abandoned upload jobs expire after a week
+        db.upload_jobs: [
+            IndexModel([('created_at', ASCENDING)], expireAfterSeconds=7 * 24 * 3600),
+        ],
+    }
+    for coll, models in indexes.items():
+        try:
+            coll.create_indexes(models)
+        except Exception as e:
+            # Never block startup on an index build (e.g. existing duplicate data)
+            logger.warning(f"Index creation on {coll.name} failed: {e}")
+
+def _handle(name):
+    get_client()
+    return _handles[name]
+
+def server_version():
+    """(major, minor) of the connected MongoDB server, asked once per process on first use."""
+    if 'server_version' not in _handles:
+        _handles['server_version'] = tuple(get_client().server_info()['versionArray'][:2])
+    return _handles['server_version']
+
+def __getattr__(name):
+    # Lazy module attributes: `from app.database import fs, collection, ...`
+    # keeps working but only touches MongoDB when first accessed.
+    if name in ('db', 'fs', 'collection', 'comments_collection', 'reactions_collection',
+                'upload_jobs_collection'):
+        return _handle(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def get_db():
     """Get the database instance for direct access."""
-    return db
+    return _handle('db')
+
+def get_collection():
+    """Get the video metadata collection for the current environment."""
+    return _handle('collection')
 
 # Database utility functions
-def save_to_db(data):
+# Payloads are only formatted at DEBUG; INFO gets a single line with ids/counts.
+def _metadata_writer(fast):
+    """The metadata collection, with an unacknowledged write concern when fast is set."""
+    collection = get_collection()
+    if fast:
+        return collection.with_options(write_concern=WriteConcern(w=0))
+    return collection
+
+def save_to_db(data, fast=FAST_METADATA_WRITES):
     """Save data to MongoDB."""
-    logger.info(f"Saving data: {data}")
-    result = collection.insert_one(data)
-    logger.info(f"Data saved with ID: {result.inserted_id}")
+    if logger.isEnabledFor(logging.DEBUG):
+        # Field names only: documents may carry user data that must not reach the logs
+        logger.debug(f"Saving document with fields: {sorted(data)}")
+    # The driver assigns a missing _id client-side, so inserted_id is known even with w=0
+    result = _metadata_writer(fast).insert_one(data)
+    logger.info("insert_one id=%s", result.inserted_id)
     return str(result.inserted_id)
 
-def fetch_from_db(query):
-    """Fetch data from MongoDB."""
-    logger.info(f"Fetching data with query: {query}")
-    data = list(collection.find(query, {"_id": 0}))  # Exclude the MongoDB `_id` field
-    logger.info(f"Fetched data: {data}")
-    return data
+def save_many_to_db(docs, fast=True):
+    """Bulk insert documents in one unordered insert_many; returns the ids as strings."""
+    if not docs:
+        return []
+    result = _metadata_writer(fast).insert_many(docs, ordered=False)
+    logger.info("insert_many count=%d", len(result.inserted_ids))
+    return [str(i) for i in result.inserted_ids]
 
-def get_single_document(query):
-    """Fetch a single document from MongoDB."""
-    logger.info(f"Fetching single document with query: {query}")
-    query_copy = dict(query)
-    
-    # Handle _id queries - try both string and ObjectId formats
-    if '_id' in query_copy and isinstance(query_copy['_id'], str):
-        # First try with string ID (for UUIDs)
-        doc = collection.find_one({'_id': query_copy['_id']})
-        if doc:
-            if '_id' in doc:
-                doc['_id'] = str(doc['_id'])
-            logger.info(f"Found document with string _id: {doc}")
-            return doc
-        
-        # Then try converting to ObjectId (for MongoDB ObjectIds)
+class MetadataWriter:
+    """Coalesces metadata inserts from concurrent requests into unordered insert_many batches.
+
+    A background thread collects documents for up to `window` seconds (or `max_batch`
+    documents) after the first one arrives, writes them in one round-trip, and
+    resolves each caller's future with its _id or its own write error.
+    """
+
+    def __init__(self, window, max_batch, fast=False):
+        self.window = window
+        self.max_batch = max_batch
+        # Batched inserts are acknowledged but not journaled unless fast (w=0) is set
+        self.write_concern = WriteConcern(w=0) if fast else WriteConcern(w=1, j=False)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, doc):
+        """Queue doc for insertion and block until its batch is written; returns the _id."""
+        future = Future()
+        self._ensure_thread()
+        self._queue.put((doc, future))
+        return future.result()
+
+    def _ensure_thread(self):
+        # Started on first use so forked workers each get their own writer thread
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='metadata-writer', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _flush(self, batch):
+        errors = {}
         try:
-            query_copy['_id'] = ObjectId(query_copy['_id'])
-            doc = collection.find_one(query_copy)
-            if doc:
-                if '_id' in doc:
-                    doc['_id'] = str(doc['_id'])
-                logger.info(f"Found document with ObjectId _id: {doc}")
-                return doc
-        except:
-            logger.info(f"Could not convert _id to ObjectId: {query_copy['_id']}")
+            collection = get_collection().with_options(write_concern=self.write_concern)
+            # insert_many fills in any missing _id on the documents themselves
+            collection.insert_many([doc for doc, _ in batch], ordered=False)
+        except BulkWriteError as e:
+            errors = {err['index']: err for err in e.details.get('writeErrors', [])}
+        except Exception as e:
+            logger.error(f"Batched metadata insert of {len(batch)} documents failed: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for index, (doc, future) in enumerate(batch):
+            err = errors.get(index)
+            if err is None:
+                future.set_result(str(doc['_id']))
+            else:
+                error_class = DuplicateKeyError if err.get('code') == 11000 else OperationFailure
+                future.set_exception(error_class(err.get('errmsg'), err.get('code'), err))
+        logger.info("insert_many batch=%d failed=%d", len(batch), len(errors))
+
+_metadata_batch_writer = MetadataWriter(
+    METADATA_BATCH_WINDOW_MS / 1000, METADATA_BATCH_MAX, fast=FAST_METADATA_WRITES
+)
+
+def save_metadata(data):
+    """Insert one video metadata document, batched with concurrent inserts when enabled."""
+    if METADATA_BATCH_WINDOW_MS <= 0:
+        return save_to_db(data)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Queueing document with fields: {sorted(data)}")
+    return _metadata_batch_writer.submit(data)
+
+class CounterWriter:
+    """Coalesces $inc counter updates on one collection into unordered bulk_write batches.
+
+    Changes are summed per document for up to `window` seconds (or until `max_batch`
+    documents have pending changes) and then written by a background thread, one
+    UpdateOne per document. Callers do not wait for the write; `pending` reports the
+    changes not yet applied so responses can include them.
+    """
+
+    def __init__(self, collection_name, window, max_batch):
+        self.collection_name = collection_name
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = {}
+        self._inflight = {}
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def add(self, doc_id, inc):
+        """Queue an $inc of `inc` (field -> delta) on the document with _id doc_id."""
+        with self._cond:
+            counters = self._pending.setdefault(doc_id, {})
+            for field, delta in inc.items():
+                counters[field] = counters.get(field, 0) + delta
+            # Started on first use so forked workers each get their own writer thread
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='counter-writer', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def pending(self, doc_id):
+        """Counter changes queued or being written for doc_id (field -> delta)."""
+        with self._cond:
+            total = dict(self._inflight.get(doc_id, {}))
+            for field, delta in self._pending.get(doc_id, {}).items():
+                total[field] = total.get(field, 0) + delta
+            return total
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending = self._pending, {}
+                self._inflight = batch
+            try:
+                self._flush(batch)
+            finally:
+                with self._cond:
+                    self._inflight = {}
+
+    def _flush(self, batch):
+        ops = []
+        for doc_id, counters in batch.items():
+            inc = {field: delta for field, delta in counters.items() if delta}
+            if inc:
+                ops.append(UpdateOne({'_id': doc_id}, {'$inc': inc}))
+        if not ops:
+            return
+        try:
+            _handle(self.collection_name).bulk_write(ops, ordered=False)
+            logger.info("bulk_write %s counters=%d", self.collection_name, len(ops))
+        except Exception as e:
+            logger.error(f"Batched counter update of {len(ops)} {self.collection_name} documents failed: {e}")
+
+# None when comment reaction counters are written immediately
+comment_counter_writer = CounterWriter(
+    'comments_collection', COMMENT_REACTION_BATCH_WINDOW_MS / 1000, COMMENT_REACTION_BATCH_MAX
+) if COMMENT_REACTION_BATCH_WINDOW_MS > 0 else None
+
+def fetch_from_db(query, projection=None, batch_size=200, limit=None, skip=None, sort=None):
+    """Return a cursor over matching documents for the caller to stream.
+
+    projection defaults to every field except `_id`; sort is a list of (key, direction).
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Fetching data with query fields: {sorted(query)}, projection: {projection}")
+    if projection is None:
+        projection = {"_id": 0}  # Exclude the MongoDB `_id` field
+    cursor = get_collection().find(query, projection, batch_size=batch_size)
+    if sort:
+        cursor = cursor.sort(sort)
+    if skip:
+        cursor = cursor.skip(skip)
+    if limit:
+        cursor = cursor.limit(limit)
+    return cursor
+
+def fetch_metadata_with_counts(query, projection=None, limit=None, skip=None, sort=None):
+    """Like fetch_from_db, but each document also carries `comment_count`.
+
+    Counts are computed server-side in the same aggregation instead of one count
+    query per video from the caller. Returns a command cursor.
+    """
+    pipeline = [{'$match': query}]
+    if sort:
+        pipeline.append({'$sort': dict(sort)})
+    if skip:
+        pipeline.append({'$skip': skip})
+    if limit:
+        pipeline.append({'$limit': limit})
+    # Comments store the video id as the client sent it (string _id or short_id), so
+    # join on both forms; an array localField matches any element and still uses the
+    # comments videoId index
+    lookup = {
+        'from': _handle('comments_collection').name,
+        'localField': '_video_ids',
+        'foreignField': 'videoId',
+        'as': 'comment_stats'
+    }
+    if server_version() >= (5, 0):
+        # Only a single count document per video leaves the join
+        lookup['pipeline'] = [{'$count': 'n'}]
+        comment_count = {'$ifNull': [{'$arrayElemAt': ['$comment_stats.n', 0]}, 0]}
+    else:
+        comment_count = {'$size': '$comment_stats'}
+    pipeline += [
+        {'$addFields': {'_video_ids': [
+            {'$toString': '$_id'},
+            {'$ifNull': ['$short_id', {'$toString': '$_id'}]},
+        ]}},
+        {'$lookup': lookup},
+        {'$addFields': {'comment_count': comment_count}},
+    ]
+    if projection is None:
+        projection = {'_id': 0}
+    final_projection = dict(projection)
+    if any(v for k, v in final_projection.items() if k != '_id'):
+        # Inclusion projection: keep the computed field
+        final_projection['comment_count'] = 1
+    else:
+        final_projection['comment_stats'] = 0
+        final_projection['_video_ids'] = 0
+    pipeline.append({'$project': final_projection})
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Aggregating metadata with counts: {pipeline}")
+    return get_collection().aggregate(pipeline, batchSize=200)
+
+def fetch_comments_with_replies(video_id):
+    """Top-level comments of a video, each with its replies in a `replies` array.
+
+    Replies are joined server-side in one aggregation instead of one find per
+    top-level comment. Returns a command cursor.
+    """
+    comments = _handle('comments_collection')
+    return comments.aggregate([
+        {'$match': {'videoId': video_id, 'parent_comment_id': None}},
+        # Replies store their parent's id as a string
+        {'$addFields': {'_parent_key': {'$toString': '$_id'}}},
+        # Equality lookup, served by the parent_comment_id index
+        {'$lookup': {
+            'from': comments.name,
+            'localField': '_parent_key',
+            'foreignField': 'parent_comment_id',
+            'as': 'replies'
+        }},
+    ], batchSize=200)
+
+def is_object_id(value):
+    """True if value is an ObjectId or a 24-hex string that can be turned into one"""
+    return isinstance(value, ObjectId) or (isinstance(value, str) and _OID_RE.match(value) is not None)
+
+def _id_filter(value):
+    """Query value for an _id that may be a UUID string or an ObjectId hex string.
+
+    Only 24-hex strings can be ObjectIds, so everything else is matched as a
+    plain string and the lookup is always a single query.
+    """
+    if isinstance(value, str) and is_object_id(value):
+        return {'$in': [value, ObjectId(value)]}
+    return value
+
+def get_single_document(query, projection=None):
+    """Fetch a single document from MongoDB, optionally only the projected fields."""
+    query_copy = dict(query)
+    if '_id' in query_copy:
+        query_copy['_id'] = _id_filter(query_copy['_id'])
     
-    # Handle other queries (including short_id)
-    doc = collection.find_one(query_copy)
+    doc = get_collection().find_one(query_copy, projection)
     if doc and '_id' in doc:
         doc['_id'] = str(doc['_id'])
-    logger.info(f"Fetched document: {doc}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Fetched document for query fields {sorted(query)}: found={doc is not None}")
     return doc
 
+def find_video(video_id, projection=None):
+    """Fetch a video by _id (UUID or ObjectId) or short_id in a single query.
+
+    Pass a projection when the caller only needs a few fields (the _id is always returned).
+    """
+    if not video_id:
+        return None
+    doc = get_collection().find_one({'$or': [
+        {'_id': _id_filter(video_id)},
+        {'short_id': video_id}
+    ]}, projection)
+    if doc:
+        doc['_id'] = str(doc['_id'])
+    return doc
+
+def increment_views(video_id):
+    """Add one view to a video found by _id or short_id and return its updated document
+    (just _id and views), or None if no video matches. One round trip."""
+    if not video_id:
+        return None
+    doc = get_collection().find_one_and_update(
+        {'$or': [{'_id': _id_filter(video_id)}, {'short_id': video_id}]},
+        {'$inc': {'views': 1}},
+        projection={'views': 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if doc:
+        doc['_id'] = str(doc['_id'])
+    return doc
+
+def get_many_by_ids(ids):
+    """Fetch many documents in one query by _id (string or ObjectId) or short_id.
+
+    Returns a dict mapping each matched _id (as a string) and short_id to its document,
+    so callers can look documents up by whichever id they hold.
+    """
+    ids = [i for i in dict.fromkeys(ids) if i]
+    if not ids:
+        return {}
+    lookup_ids = list(ids)
+    for i in ids:
+        if isinstance(i, str) and is_object_id(i):
+            lookup_ids.append(ObjectId(i))
+    docs = get_collection().find({'$or': [
+        {'_id': {'$in': lookup_ids}},
+        {'short_id': {'$in': ids}}
+    ]})
+    by_id = {}
+    matched = 0
+    for doc in docs:
+        matched += 1
+        doc['_id'] = str(doc['_id'])
+        by_id[doc['_id']] = doc
+        if doc.get('short_id'):
+            by_id[doc['short_id']] = doc
+    logger.info("find by ids requested=%d matched=%d", len(ids), matched)
+    return by_id
+
 def update_db(query, update):
     """Update documents in MongoDB."""
-    logger.info(f"Updating documents with query: {query}, update: {update}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Updating documents with query fields: {sorted(query)}, operators: {sorted(update)}")
     
-    # Handle string _id - try as string first, then as ObjectId if needed
     query_copy = dict(query)
-    if '_id' in query_copy and isinstance(query_copy['_id'], str):
-        # First try with string ID (for UUIDs)
-        result = collection.update_one(query_copy, update)
-        if result.matched_count > 0:
-            logger.info(f"Updated {result.modified_count} documents with string _id")
-            return result.modified_count
-        
-        # If no match, try converting to ObjectId
-        try:
-            query_copy['_id'] = ObjectId(query_copy['_id'])
-            result = collection.update_one(query_copy, update)
-            logger.info(f"Updated {result.modified_count} documents with ObjectId _id")
-            return result.modified_count
-        except:
-            logger.info(f"Could not convert _id to ObjectId: {query['_id']}")
-            return 0
+    if '_id' in query_copy:
+        query_copy['_id'] = _id_filter(query_copy['_id'])
     
-    result = collection.update_one(query_copy, update)
-    logger.info(f"Updated {result.modified_count} documents")
+    result = get_collection().update_one(query_copy, update)
+    logger.info("update_one _id=%s modified=%d", query.get('_id'), result.modified_count)
     return result.modified_count
 
+# Counter change for each (previous reaction, new reaction) transition, applied as one $inc;
+# transitions that leave the counters alone are absent
+REACTION_DELTAS = {
+    ("none", "like"): {'likes': 1},
+    ("none", "dislike"): {'dislikes': 1},
+    ("like", "none"): {'likes': -1},
+    ("like", "dislike"): {'likes': -1, 'dislikes': 1},
+    ("dislike", "none"): {'dislikes': -1},
+    ("dislike", "like"): {'likes': 1, 'dislikes': -1},
+}
+
+def apply_reaction(target_collection, target_id, reaction_filter, reaction_type, timestamp, insert_fields=None,
+                   counter_writer=None):
+    """Set (or with reaction_type "none" remove) a user's reaction and adjust the target's counters.
+
+    The previous reaction is read and replaced in one findAndModify, and the counter
+    change plus the read-back of the new totals is a second one, so a reaction costs
+    two round trips however the state changes.
+
+    :param target_collection: Collection holding the reacted-to document (videos or comments)
+    :param target_id: _id of that document
+    :param reaction_filter: Identifies the user's reaction document
+    :param reaction_type: "like", "dislike" or "none"
+    :param timestamp: Timestamp stored on the reaction
+    :param insert_fields: Fields beyond reaction_filter for a newly created reaction document
+    :param counter_writer: Optional CounterWriter for target_collection; the counter change is
+        then queued and the totals are read back with the still-pending changes added
+    :return: (likes, dislikes) after the change, or None if the target is gone
+    """
+    reactions = _handle('reactions_collection')
+    if reaction_type == "none":
+        previous = reactions.find_one_and_delete(reaction_filter, projection={'type': 1})
+    else:
+        update = {'$set': {'type': reaction_type, 'timestamp': timestamp}}
+        if insert_fields:
+            update['$setOnInsert'] = insert_fields
+        previous = reactions.find_one_and_update(
+            reaction_filter,
+            update,
+            projection={'type': 1},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+    old_type = previous.get('type') if previous else "none"
+
+    inc = REACTION_DELTAS.get((old_type, reaction_type))
+    counts = {'_id': 0, 'likes': 1, 'dislikes': 1}
+    if counter_writer is not None:
+        if inc:
+            counter_writer.add(target_id, inc)
+        doc = target_collection.find_one({'_id': _id_filter(target_id)}, counts)
+        if doc is None:
+            return None
+        pending = counter_writer.pending(target_id)
+        return doc.get('likes', 0) + pending.get('likes', 0), doc.get('dislikes', 0) + pending.get('dislikes', 0)
+    if inc:
+        doc = target_collection.find_one_and_update(
+            {'_id': _id_filter(target_id)}, {'$inc': inc},
+            projection=counts, return_document=ReturnDocument.AFTER
+        )
+    else:
+        doc = target_collection.find_one({'_id': _id_filter(target_id)}, counts)
+    if doc is None:
+        return None
+    return doc.get('likes', 0), doc.get('dislikes', 0)
+
+# Upload jobs (ASYNC_POST_PROCESSING): one document per accepted upload, keyed by video id
+UPLOAD_JOB_PROCESSING = 'processing'
+UPLOAD_JOB_READY = 'ready'
+UPLOAD_JOB_FAILED = 'failed'
+
+def create_upload_job(job_id, user_id, video_id=None):
+    """Record an accepted upload whose post-processing is still running."""
+    now = datetime.datetime.utcnow()
+    _handle('upload_jobs_collection').insert_one({
+        '_id': job_id, 'user_id': user_id, 'video_id': video_id, 'status': UPLOAD_JOB_PROCESSING,
+        'created_at': now, 'updated_at': now
+    })
+
+def update_upload_job(job_id, status, **fields):
+    """Set an upload job's status (plus e.g. video_id or error)."""
+    fields.update(status=status, updated_at=datetime.datetime.utcnow())
+    _handle('upload_jobs_collection').update_one({'_id': job_id}, {'$set': fields})
+
+def get_upload_job(job_id):
+    return _handle('upload_jobs_collection').find_one({'_id': job_id})
+
 def delete_from_db(filters):
     """Delete data from MongoDB based on filters."""
-    logger.info(f"Deleting data with filters: {filters}")
-    result = collection.delete_many(filters)
-    logger.info(f"Deleted {result.deleted_count} documents from the collection")
-    return result.deleted_count
\ No newline at end of file
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Deleting data with filter fields: {sorted(filters)}")
+    result = get_collection().delete_many(filters)
+    logger.info("delete_many deleted=%d", result.deleted_count)
+    return result.deleted_count
@@ -1,16 +1,87 @@
 from datetime import datetime, timedelta
 import bcrypt
 import jwt
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHashError
 from flask import current_app
 from email_validator import validate_email, EmailNotValidError
 import re
-from .database import get_db
+from .database import get_db, is_object_id
+from .config import JWT_ALGORITHM
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
+
+# Recently loaded users (without password hash), keyed by str(_id). Dropped on
+# update/change_password; other processes see changes after at most the TTL.
+_user_cache = TTLCache(maxsize=5000, ttl=60)
+_user_cache_lock = threading.Lock()
+
+def _invalidate_cached_user(user_id):
+    with _user_cache_lock:
+        _user_cache.pop(str(user_id), None)
+
+# New passwords are hashed with argon2id; bcrypt hashes from before the switch are
+# still accepted and upgraded on the next successful login.
+_password_hasher = PasswordHasher()
+
+# argon2 and bcrypt release the GIL, so hashes run in parallel on a small native
+# thread pool instead of tying up the request thread/greenlet. Created on first use
+# so that under gevent workers it is built after monkey-patching, with gevent's
+# pool (real OS threads whose results are awaited cooperatively).
+_HASH_POOL = None
+_hash_pool_lock = threading.Lock()
+
+def _hash_pool():
+    global _HASH_POOL
+    if _HASH_POOL is None:
+        with _hash_pool_lock:
+            if _HASH_POOL is None:
+                workers = os.cpu_count() or 4
+                try:
+                    from gevent import monkey
+                    patched = monkey.is_module_patched('threading')
+                except ImportError:
+                    patched = False
+                if patched:
+                    from gevent.threadpool import ThreadPoolExecutor as GeventThreadPoolExecutor
+                    _HASH_POOL = GeventThreadPoolExecutor(max_workers=workers)
+                else:
+                    _HASH_POOL = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='passwd')
+    return _HASH_POOL
+
+def _argon2_verify(password_hash, password):
+    try:
+        return _password_hasher.verify(password_hash, password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+# Signed tokens per (user_id, username, token_version), reused while more than half
+# of their lifetime remains so logins near expiry still get a fresh token. LRU-bounded.
+_JWT_CACHE = OrderedDict()
+_JWT_CACHE_MAX = 10000
+_jwt_cache_lock = threading.Lock()
+
+class DuplicateUserError(Exception):
+    """Raised by User.create when the username or email is already registered."""
+    def __init__(self, field):
+        super().__init__(f"{field} already exists")
+        self.field = field
+
+_USERNAME_RE = re.compile(r'\A[A-Za-z0-9_-]{3,30}\Z')
 
 class User:
+    __slots__ = ('_id', 'username', 'email', 'password_hash', 'first_name', 'last_name',
+                 'bio', 'profile_picture', 'created_at', 'updated_at', 'token_version')
+
     def __init__(self, _id=None, username=None, email=None, password_hash=None, 
                  first_name='', last_name='', bio='', profile_picture=None, 
-                 created_at=None, updated_at=None):
+                 created_at=None, updated_at=None, token_version=0):
         self._id = _id
         self.username = username
         self.email = email
@@ -21,17 +92,18 @@ class User:
         self.profile_picture = profile_picture
         self.created_at = created_at or datetime.utcnow()
         self.updated_at = updated_at or datetime.utcnow()
+        self.token_version = token_version
     
     @staticmethod
     def validate_username(username):
         """Validate username format"""
+        if username and _USERNAME_RE.match(username):
+            return True, ""
+        
         if not username or len(username) < 3 or len(username) > 30:
             return False, "Username must be between 3 and 30 characters"
         
-        if not re.match(r'^[a-zA-Z0-9_-]+$', username):
-            return False, "Username can only contain letters, numbers, underscores, and hyphens"
-        
-        return True, ""
+        return False, "Username can only contain letters, numbers, underscores, and hyphens"
     
     @staticmethod
     def validate_email(email):
@@ -52,28 +124,67 @@ class User:
     
     @staticmethod
     def hash_password(password):
-        """Hash password using bcrypt"""
-        salt = bcrypt.gensalt()
-        return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+        """Hash password using argon2id"""
+        return _hash_pool().submit(_password_hasher.hash, password).result()
     
     def check_password(self, password):
-        """Check if provided password matches the hash"""
+        """Check if provided password matches the hash (argon2id or legacy bcrypt)"""
         if not self.password_hash:
             return False
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        if self.password_hash.startswith('$argon2'):
+            valid = _hash_pool().submit(_argon2_verify, self.password_hash, password).result()
+            if valid and _password_hasher.check_needs_rehash(self.password_hash):
+                self._upgrade_password_hash(password)
+            return valid
+        valid = _hash_pool().submit(
+            bcrypt.checkpw, password.encode('utf-8'), self.password_hash.encode('utf-8')
+        ).result()
+        if valid:
+            self._upgrade_password_hash(password)
+        return valid
+    
+    def _upgrade_password_hash(self, password):
+        """Re-hash a verified password with the current argon2id parameters"""
+        try:
+            new_hash = User.hash_password(password)
+            # Only replace the hash that was verified, in case the password changed meanwhile
+            get_db().users.update_one(
+                {'_id': self._id, 'password_hash': self.password_hash},
+                {'$set': {'password_hash': new_hash}}
+            )
+            self.password_hash = new_hash
+        except Exception as e:
+            # The login itself already succeeded; the upgrade is retried next time
+            current_app.logger.warning(f"Password hash upgrade failed for user {self._id}: {e}")
     
     def generate_token(self):
-        """Generate JWT token for the user"""
-        expiration = datetime.utcnow() + timedelta(hours=int(current_app.config.get('JWT_EXPIRATION_HOURS', 24)))
+        """Generate JWT token for the user (reusing a recent one for the same identity)"""
+        lifetime = timedelta(hours=int(current_app.config.get('JWT_EXPIRATION_HOURS', 24)))
+        key = (str(self._id), self.username, self.token_version)
+        now = time.time()
+        with _jwt_cache_lock:
+            cached = _JWT_CACHE.get(key)
+            if cached and cached[1] - now > lifetime.total_seconds() / 2:
+                _JWT_CACHE.move_to_end(key)
+                return cached[0]
+        
+        expiration = datetime.utcnow() + lifetime
         
         payload = {
             'user_id': str(self._id),
             'username': self.username,
+            'token_version': self.token_version,
             'exp': expiration,
             'iat': datetime.utcnow()
         }
         
-        return jwt.encode(payload, current_app.config['JWT_SECRET_KEY'], algorithm='HS256')
+        token = jwt.encode(payload, current_app.config['JWT_SECRET_KEY'], algorithm=JWT_ALGORITHM)
+        with _jwt_cache_lock:
+            _JWT_CACHE[key] = (token, now + lifetime.total_seconds())
+            _JWT_CACHE.move_to_end(key)
+            while len(_JWT_CACHE) > _JWT_CACHE_MAX:
+                _JWT_CACHE.popitem(last=False)
+        return token
     
     def to_dict(self):
         """Convert user object to dictionary"""
@@ -103,12 +214,17 @@ class User:
             bio=data.get('bio', ''),
             profile_picture=data.get('profile_picture'),
             created_at=data.get('created_at'),
-            updated_at=data.get('updated_at')
+            updated_at=data.get('updated_at'),
+            token_version=data.get('token_version', 0)
         )
     
     @staticmethod
     def create(username, email, password, first_name='', last_name='', bio='', profile_picture=None):
-        """Create a new user"""
+        """Create a new user.
+
+        Returns None if validation fails; raises DuplicateUserError if the
+        username or email is already taken.
+        """
         try:
             # Validate inputs
             username_valid, username_error = User.validate_username(username)
@@ -126,16 +242,6 @@ class User:
                 current_app.logger.error(f"Password validation failed: {password_error}")
                 return None
             
-            # Check if user already exists
-            db = get_db()
-            if db.users.find_one({'username': username}):
-                current_app.logger.error(f"Username already exists: {username}")
-                return None
-            
-            if db.users.find_one({'email': email}):
-                current_app.logger.error(f"Email already registered: {email}")
-                return None
-            
             # Create user document
             user_doc = {
                 'username': username,
@@ -149,45 +255,56 @@ class User:
                 'updated_at': datetime.utcnow()
             }
             
-            # Insert into database
-            result = db.users.insert_one(user_doc)
-            user_doc['_id'] = result.inserted_id
-            
-            # Create indexes if they don't exist
+            # Insert into database; the unique indexes reject duplicates atomically
+            db = get_db()
             try:
-                db.users.create_index('username', unique=True)
-                db.users.create_index('email', unique=True)
-            except Exception as e:
-                current_app.logger.warning(f"Index creation warning: {e}")
+                result = db.users.insert_one(user_doc)
+            except DuplicateKeyError as e:
+                key_pattern = (e.details or {}).get('keyPattern') or {}
+                field = 'email' if 'email' in key_pattern or 'index: email_' in str(e) else 'username'
+                current_app.logger.error(f"Duplicate {field} on registration: {username}")
+                raise DuplicateUserError(field)
+            user_doc['_id'] = result.inserted_id
             
             return User.from_dict(user_doc)
             
+        except DuplicateUserError:
+            raise
         except Exception as e:
             current_app.logger.error(f"Error creating user: {e}")
             return None
     
     @staticmethod
-    def get_by_id(user_id):
-        """Get user by ID"""
+    def get_by_id(user_id, include_password=False):
+        """Get user by ID (the password hash is only loaded when include_password is set)"""
         try:
-            db = get_db()
-            
             # Handle both ObjectId objects and ObjectId strings
             if isinstance(user_id, ObjectId):
                 query_id = user_id
             elif isinstance(user_id, str):
-                try:
-                    query_id = ObjectId(user_id)
-                except Exception as e:
-                    current_app.logger.error(f"Invalid ObjectId format: {user_id}, error: {e}")
+                if not is_object_id(user_id):
+                    current_app.logger.error(f"Invalid ObjectId format: {user_id}")
                     return None
+                query_id = ObjectId(user_id)
             else:
                 current_app.logger.error(f"Invalid user_id type: {type(user_id)}")
                 return None
             
-            user_doc = db.users.find_one({'_id': query_id})
+            if not include_password:
+                with _user_cache_lock:
+                    cached = _user_cache.get(str(query_id))
+                if cached:
+                    return cached
+            
+            db = get_db()
+            projection = None if include_password else {'password_hash': 0}
+            user_doc = db.users.find_one({'_id': query_id}, projection)
             if user_doc:
-                return User.from_dict(user_doc)
+                user = User.from_dict(user_doc)
+                if not include_password:
+                    with _user_cache_lock:
+                        _user_cache[str(query_id)] = user
+                return user
             
             current_app.logger.warning(f"User not found with ID: {user_id}")
             return None
@@ -196,11 +313,12 @@ class User:
             return None
     
     @staticmethod
-    def get_by_username(username):
-        """Get user by username"""
+    def get_by_username(username, include_password=False):
+        """Get user by username (the password hash is only loaded when include_password is set)"""
         try:
             db = get_db()
-            user_doc = db.users.find_one({'username': username})
+            projection = None if include_password else {'password_hash': 0}
+            user_doc = db.users.find_one({'username': username}, projection)
             if user_doc:
                 return User.from_dict(user_doc)
             return None
@@ -209,11 +327,12 @@ class User:
             return None
     
     @staticmethod
-    def get_by_email(email):
-        """Get user by email"""
+    def get_by_email(email, include_password=False):
+        """Get user by email (the password hash is only loaded when include_password is set)"""
         try:
             db = get_db()
-            user_doc = db.users.find_one({'email': email.lower()})
+            projection = None if include_password else {'password_hash': 0}
+            user_doc = db.users.find_one({'email': email.lower()}, projection)
             if user_doc:
                 return User.from_dict(user_doc)
             return None
@@ -225,10 +344,13 @@ class User:
     def authenticate(username, password):
         """Authenticate user with username/password"""
         try:
-            # Try to find user by username or email
-            user = User.get_by_username(username)
-            if not user:
-                user = User.get_by_email(username)  # Allow login with email
+            # Match by username or email (login with email is allowed) in one indexed query
+            db = get_db()
+            user_doc = db.users.find_one({'$or': [
+                {'username': username},
+                {'email': username.lower()}
+            ]})
+            user = User.from_dict(user_doc) if user_doc else None
             
             if user and user.check_password(password):
                 return user
@@ -267,6 +389,7 @@ class User:
                 {'$set': update_data}
             )
             
+            _invalidate_cached_user(self._id)
             if result.modified_count > 0:
                 self.updated_at = update_data['updated_at']
                 return self
@@ -289,19 +412,22 @@ class User:
             # Hash new password
             new_password_hash = User.hash_password(new_password)
             
-            # Update in database
+            # Update in database; bumping token_version revokes previously issued tokens
             db = get_db()
             result = db.users.update_one(
                 {'_id': self._id},
                 {'$set': {
                     'password_hash': new_password_hash,
                     'updated_at': datetime.utcnow()
-                }}
+                },
+                 '$inc': {'token_version': 1}}
             )
             
+            _invalidate_cached_user(self._id)
             if result.modified_count > 0:
                 self.password_hash = new_password_hash
                 self.updated_at = datetime.utcnow()
+                self.token_version += 1
                 return True
             
             return False
@@ -1,20 +1,37 @@
 import os
+import fcntl
+import struct
 import threading
-from flask import request, jsonify, current_app
+from concurrent.futures import wait
+from contextlib import contextmanager
+from flask import request, jsonify, stream_with_context, copy_current_request_context
 from bson.objectid import ObjectId
+from gridfs.errors import NoFile
+from pymongo.errors import DuplicateKeyError
+from cachetools import LRUCache
+from werkzeug.exceptions import RequestEntityTooLarge
 from app import app, logger
-from app.database import save_to_db, fetch_from_db, fs, delete_from_db, update_db, get_single_document, get_db
-from app.utils import extract_video_metadata, schedule_delete, process_video_for_web_compatibility, process_video_async
-from app.config import UPLOAD_FOLDER
-from app.s3 import upload_to_s3
-from app.auth import auth_bp, jwt_required, optional_jwt
+from app.database import (
+    save_metadata, fetch_from_db, fetch_metadata_with_counts, fs, delete_from_db, update_db,
+    find_video, get_many_by_ids, get_db, is_object_id,
+    comments_collection, get_collection, apply_reaction, comment_counter_writer,
+    fetch_comments_with_replies, increment_views,
+    create_upload_job, update_upload_job, get_upload_job,
+    UPLOAD_JOB_PROCESSING, UPLOAD_JOB_READY, UPLOAD_JOB_FAILED
+)
+from app.utils import extract_video_metadata, schedule_delete, process_video_for_web_compatibility, process_video_async, detect_video_codec, ASYNC_PROCESSING, local_copy_required, parallel_range_download, http_session, save_stream, append_file, assemble_chunks, run_blocking, VIDEO_EXTENSIONS, run_in_background
+from app.config import UPLOAD_FOLDER, MAX_UPLOAD_BYTES, ASYNC_POST_PROCESSING, THUMBNAIL_CACHE_BYTES, THUMBNAIL_CACHE_MAX_ITEM_BYTES, S3_PART_WAIT_TIMEOUT
+from app.s3 import (
+    upload_to_s3, upload_fileobj_to_s3, create_multipart_upload, upload_part, upload_part_from_file_async,
+    complete_multipart_upload, abort_multipart_upload, MIN_MULTIPART_PART_SIZE, MAX_MULTIPART_PARTS
+)
+from app.auth import jwt_required
 import uuid
-import requests
 import datetime
-import tempfile
-import shutil
-import random
-import string
+import hashlib
+import orjson
+from urllib.parse import urlparse
+import secrets
 import time
 
 # Authentication blueprint is registered in __init__.py
@@ -23,80 +40,290 @@ import time
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 
-# Configure Flask for large file uploads (10GB max)
-app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024 * 1024  # 10GB in bytes
+# Werkzeug refuses larger bodies (413) without reading them
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
 
-# Set streaming threshold to handle large files without loading them into memory
-app.config['MAX_CONTENT_LENGTH_FOR_STREAMING'] = 10 * 1024 * 1024  # Use streaming for files larger than 10MB
+@app.errorhandler(413)
+def request_entity_too_large(e):
+    return jsonify({"success": False, "error": f"Upload exceeds the {MAX_UPLOAD_BYTES} byte limit", "code": 413}), 413
 
 
+# Thumbnails never change under an id (a new upload gets a new id), so clients and
+# CDNs may keep them for a year without revalidating
+THUMBNAIL_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# GridFS chunk size for thumbnails. The 255 KiB default splits a multi-MB thumbnail
+# into many small chunk documents; at 4 MiB nearly every thumbnail is a single chunk
+THUMBNAIL_GRIDFS_CHUNK_SIZE = 4 * 1024 * 1024
+
+# In-process cache of hot thumbnails as (bytes, upload_date), bounded by total byte size
+# rather than count. GridFS files never change under an id, so entries only go away on
+# eviction or delete.
+_thumbnail_cache = LRUCache(maxsize=THUMBNAIL_CACHE_BYTES, getsizeof=lambda entry: len(entry[0]))
+_thumbnail_cache_lock = threading.Lock()
+
+def _cached_thumbnail(thumbnail_id):
+    with _thumbnail_cache_lock:
+        return _thumbnail_cache.get(thumbnail_id)
+
+def _cache_thumbnail(thumbnail_id, data, upload_date=None):
+    with _thumbnail_cache_lock:
+        _thumbnail_cache[thumbnail_id] = (data, upload_date)
+
+def put_thumbnail(data, filename):
+    """Store thumbnail bytes in GridFS and write them through to the cache; returns the id string.
+    
+    Identical bytes (same SHA-256) reuse the thumbnail already stored instead of writing a copy.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    existing = get_db().fs.files.find_one({"metadata.sha256": digest}, {"uploadDate": 1})
+    if existing:
+        thumbnail_id, upload_date = str(existing["_id"]), existing.get("uploadDate")
+    else:
+        grid_in = fs.new_file(
+            filename=filename,
+            content_type='image/jpeg',
+            chunk_size=THUMBNAIL_GRIDFS_CHUNK_SIZE,
+            metadata={"sha256": digest}
+        )
+        try:
+            grid_in.write(data)
+        finally:
+            grid_in.close()
+        thumbnail_id, upload_date = str(grid_in._id), grid_in.upload_date
+    if len(data) <= THUMBNAIL_CACHE_MAX_ITEM_BYTES:
+        _cache_thumbnail(thumbnail_id, data, upload_date)
+    return thumbnail_id
+
+def evict_cached_thumbnail(thumbnail_id):
+    """Drop a thumbnail from the in-process cache (after deleting it from GridFS)."""
+    with _thumbnail_cache_lock:
+        _thumbnail_cache.pop(str(thumbnail_id), None)
+
+def _thumbnail_response(thumbnail_id, body, upload_date=None, length=None):
+    response = app.response_class(body, mimetype='image/jpeg', direct_passthrough=length is not None)
+    if length is not None:
+        response.content_length = length
+    response.set_etag(thumbnail_id)
+    if upload_date is not None:
+        response.last_modified = upload_date
+    response.headers['Cache-Control'] = THUMBNAIL_CACHE_CONTROL
+    return response
+
 @app.route('/thumbnail/<thumbnail_id>', methods=['GET'])
 def get_thumbnail(thumbnail_id):
-    """Retrieve a thumbnail from GridFS."""
+    """Serve a thumbnail from the in-process cache, or stream it from GridFS."""
+    if not is_object_id(thumbnail_id):
+        return jsonify({"error": "Invalid thumbnail ID"}), 400
+
+    # The id never changes content, so it doubles as the ETag; answer revalidation
+    # before touching GridFS at all
+    if thumbnail_id in request.if_none_match:
+        response = app.response_class(status=304)
+        response.set_etag(thumbnail_id)
+        response.headers['Cache-Control'] = THUMBNAIL_CACHE_CONTROL
+        return response
+
+    cached = _cached_thumbnail(thumbnail_id)
+    if cached is not None:
+        return _thumbnail_response(thumbnail_id, *cached)
+
     try:
         thumbnail = fs.get(ObjectId(thumbnail_id))
-        return app.response_class(thumbnail.read(), mimetype='image/jpeg')
+    except NoFile:
+        return jsonify({"error": "Thumbnail not found"}), 404
     except Exception as e:
         logger.error(f"Error fetching thumbnail: {e}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/metadata', methods=['GET', 'OPTIONS'])
-def get_metadata():
-    """Retrieve metadata from MongoDB."""
-    # Handle preflight requests
-    if request.method == 'OPTIONS':
-        response = jsonify({'status': 'ok'})
-        response.headers['Access-Control-Allow-Origin'] = '*'
-        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
-        return response
+    if thumbnail.length <= THUMBNAIL_CACHE_MAX_ITEM_BYTES:
+        try:
+            data = thumbnail.read()
+        finally:
+            thumbnail.close()
+        _cache_thumbnail(thumbnail_id, data, thumbnail.upload_date)
+        return _thumbnail_response(thumbnail_id, data, thumbnail.upload_date)
+
+    def generate():
+        try:
+            # Iterating a GridOut yields each stored GridFS chunk as-is
+            for chunk in thumbnail:
+                yield chunk
+        finally:
+            thumbnail.close()
+
+    return _thumbnail_response(thumbnail_id, generate(), thumbnail.upload_date, thumbnail.length)
+
+# Fields returned by the metadata listing (see format_metadata_item)
+METADATA_FIELDS = (
+    "id", "short_id", "title", "description", "s3_url", "thumbnail_id", "duration",
+    "resolution", "upload_date", "uploader", "views", "likes", "dislikes", "players"
+)
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Fields the ownership checks read from a video
+VIDEO_OWNER_FIELDS = {"user_id": 1, "uploader": 1}
+
+# Query-string filters accepted by /metadata, mapped to the type each value is
+# coerced to; each is backed by an index, so a filter can never turn the listing
+# into a collection scan
+METADATA_FILTERS = {
+    "short_id": str, "internal_name": str, "thumbnail_id": str,
+    "uploader": str, "uploader_id": str, "uploader_username": str
+}
+
+# Query-string parameters that shape the /metadata listing rather than filter it
+METADATA_LISTING_PARAMS = frozenset({"fields", "include_counts", "page", "page_size"})
+
+# Form fields /upload reads; anything else a client sends is ignored
+UPLOAD_FORM_FIELDS = ("url", "save_to_s3", "id", "title", "description", "uploader", "players", "short_id")
+
+def parse_metadata_filters(args, allowed=frozenset()):
+    """Pick the whitelisted filters out of the query string, coercing each value once.
+
+    Returns (filters, unsupported) where unsupported lists the parameters that are
+    neither a known filter nor in allowed.
+    """
+    filters = {}
+    unsupported = []
+    for key, value in args.items():
+        coerce = METADATA_FILTERS.get(key)
+        if coerce is not None:
+            filters[key] = coerce(value)
+        elif key not in allowed:
+            unsupported.append(key)
+    return filters, sorted(unsupported)
+
+# ?page_size bounds for the paginated metadata listing
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+def metadata_projection(fields):
+    """MongoDB projection loading only the stored fields behind the given metadata fields."""
+    projection = {"_id": 0}
+    for field in fields:
+        if field != "id":
+            projection[field] = 1
+    return projection
+
+# Values for listing fields a stored document lacks; "id", "upload_date" and "players"
+# need a fresh value per row and are filled in by format_metadata_item
+_METADATA_DEFAULTS = {
+    "short_id": "", "title": "", "description": "", "s3_url": "", "thumbnail_id": "",
+    "duration": 0, "resolution": "", "uploader": "Anonymous", "views": 0, "likes": 0, "dislikes": 0
+}
+_MISSING = object()
+
+def format_metadata_item(item, fields=METADATA_FIELDS):
+    """Transform a metadata document to match the expected format in the API docs.
     
+    Only the given listing fields are built, and per-row defaults are computed only
+    for fields the document is actually missing.
+    """
+    formatted = {}
+    for field in fields:
+        value = item.get("_id" if field == "id" else field, _MISSING)
+        if value is _MISSING:
+            if field == "id":
+                value = str(uuid.uuid4())
+            elif field == "upload_date":
+                value = datetime.datetime.now().isoformat()
+            elif field == "players":
+                value = []
+            else:
+                value = _METADATA_DEFAULTS[field]
+        formatted[field] = value
+    return formatted
+
+@app.route('/metadata', methods=['GET'])
+def get_metadata():
+    """Retrieve metadata from MongoDB, streamed as a JSON array."""
+    args = request.args
+    filters, unsupported = parse_metadata_filters(args, METADATA_LISTING_PARAMS)
+    if unsupported:
+        return jsonify({"error": f"Unsupported filters: {', '.join(unsupported)}"}), 400
+
+    # Optional ?fields=a,b,c selects a subset of the listing fields
+    fields = METADATA_FIELDS
+    requested = args.get('fields')
+    if requested:
+        fields = tuple(f for f in (f.strip() for f in requested.split(',')) if f)
+        unknown = [f for f in fields if f not in METADATA_FIELDS]
+        if unknown:
+            return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+
+    # Optional ?include_counts=true adds comment_count, computed in the same query
+    include_counts = args.get('include_counts', 'false').lower() == 'true'
+
+    # Optional ?page=&page_size= returns one page, newest first; without them the
+    # full listing is returned as before
+    page_args = {}
+    if 'page' in args or 'page_size' in args:
+        try:
+            page = int(args.get('page', 1))
+            page_size = int(args.get('page_size', DEFAULT_PAGE_SIZE))
+        except ValueError:
+            return jsonify({"error": "page and page_size must be integers"}), 400
+        if page < 1 or page_size < 1:
+            return jsonify({"error": "page and page_size must be positive"}), 400
+        page_size = min(page_size, MAX_PAGE_SIZE)
+        page_args = {
+            'skip': (page - 1) * page_size,
+            'limit': page_size,
+            'sort': [('upload_date', -1), ('_id', 1)]
+        }
+
+    def format_item(item):
+        formatted = format_metadata_item(item, fields)
+        if include_counts:
+            formatted["comment_count"] = item.get("comment_count", 0)
+        return formatted
+
     try:
-        filters = request.args.to_dict()
-        metadata = fetch_from_db(filters)
-        # Transform the response to match the expected format in the API docs
-        formatted_metadata = []
-        for item in metadata:
-            formatted_item = {
-                "id": item.get("_id", str(uuid.uuid4())),
-                "short_id": item.get("short_id", ""),
-                "title": item.get("title", ""),
-                "description": item.get("description", ""),
-                "s3_url": item.get("s3_url", ""),
-                "thumbnail_id": item.get("thumbnail_id", ""),
-                "duration": item.get("duration", 0),
-                "resolution": item.get("resolution", ""),
-                "upload_date": item.get("upload_date", datetime.datetime.now().isoformat()),
-                "uploader": item.get("uploader", "Anonymous"),
-                "views": item.get("views", 0),
-                "likes": item.get("likes", 0),
-                "dislikes": item.get("dislikes", 0),
-                "players": item.get("players", [])
-            }
-            formatted_metadata.append(formatted_item)
-        logger.info(f"Fetched metadata: {formatted_metadata}")
-        response = jsonify(formatted_metadata)
-        response.headers['Access-Control-Allow-Origin'] = '*'
-        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
-        return response, 200
+        if include_counts:
+            cursor = fetch_metadata_with_counts(filters, projection=metadata_projection(fields), **page_args)
+        else:
+            cursor = fetch_from_db(filters, projection=metadata_projection(fields), **page_args)
+        # Pull the first batch now so query errors still produce a 500
+        first = next(cursor, None)
     except Exception as e:
         logger.error(f"Error fetching metadata: {e}")
-        response = jsonify({"error": str(e)})
-        response.headers['Access-Control-Allow-Origin'] = '*'
-        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
-        return response, 500
+        return jsonify({"error": str(e)}), 500
+
+    # Clients that ask for NDJSON get one document per line, so they can parse the
+    # listing incrementally instead of waiting for the closing bracket
+    ndjson = request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+    def generate():
+        try:
+            if ndjson:
+                if first is not None:
+                    yield app.json.dumps_bytes(format_item(first)) + b'\n'
+                    for item in cursor:
+                        yield app.json.dumps_bytes(format_item(item)) + b'\n'
+                return
+            yield b'['
+            if first is not None:
+                yield app.json.dumps_bytes(format_item(first))
+                for item in cursor:
+                    yield b',' + app.json.dumps_bytes(format_item(item))
+            yield b']'
+        except Exception as e:
+            logger.error(f"Error streaming metadata: {e}")
+            raise
+        finally:
+            cursor.close()
+
+    mimetype = NDJSON_MIMETYPE if ndjson else 'application/json'
+    return app.response_class(stream_with_context(generate()), mimetype=mimetype), 200
 
 @app.route('/metadata/<video_id>', methods=['GET'])
 def get_video_metadata(video_id):
     """Retrieve metadata for a specific video by _id, short_id, or legacy UUID."""
     try:
-        # Try to find by _id first
-        video = get_single_document({"_id": video_id})
-        if not video:
-            # Try to find by short_id
-            video = get_single_document({"short_id": video_id})
+        # Find by _id (UUID or ObjectId) or short_id
+        video = find_video(video_id)
         if not video:
             return jsonify({"error": "Video not found"}), 404
         # Format the response to match API specs
@@ -125,29 +352,15 @@ def get_video_metadata(video_id):
 def increment_view_count(video_id):
     """Increment view count for a specific video by _id or short_id."""
     try:
-        # Try to find by _id (ObjectId or string)
-        video = get_single_document({"_id": video_id})
-        if not video:
-            # Try to find by short_id
-            video = get_single_document({"short_id": video_id})
+        # Find by _id (ObjectId or string) or short_id, increment and read back in one call
+        video = increment_views(video_id)
         if not video:
             return jsonify({"success": False, "error": "Video not found"}), 404
         
-        # Use the actual _id from the found video for updating
-        actual_id = video.get("_id")
-        if not actual_id:
-            return jsonify({"success": False, "error": "Video has no _id"}), 500
-            
-        update_db({"_id": actual_id}, {"$inc": {"views": 1}})
-        
-        # Get updated view count
-        updated_video = get_single_document({"_id": actual_id})
-        current_views = updated_video.get("views", 0) if updated_video else 0
-        
         return jsonify({
             "success": True,
-            "videoId": actual_id,
-            "views": current_views
+            "videoId": video["_id"],
+            "views": video.get("views", 0)
         }), 200
     except Exception as e:
         logger.error(f"Error incrementing view count: {e}")
@@ -157,8 +370,10 @@ def increment_view_count(video_id):
 @app.route('/metadata', methods=['DELETE'])
 def delete_metadata():
     """Delete metadata from MongoDB with optional filters."""
+    filters, unsupported = parse_metadata_filters(request.args)
+    if unsupported:
+        return jsonify({"error": f"Unsupported filters: {', '.join(unsupported)}"}), 400
     try:
-        filters = request.args.to_dict()
         deleted_count = delete_from_db(filters)
         return jsonify({"message": f"Deleted {deleted_count} documents"}), 200
     except Exception as e:
@@ -170,142 +385,239 @@ def delete_metadata():
 def upload_file():
     """Upload and save a video file."""
     upload_start_time = time.time()
+    # Reject oversized uploads from the headers alone, before any of the body is read
+    if request.content_length is not None and request.content_length > MAX_UPLOAD_BYTES:
+        return request_entity_too_large(None)
     try:
         logger.info("🚀 Starting file upload process")
         
         save_to_s3 = True
+        filename = None
         step_start = time.time()
+        # Read the known form fields once; they are reused for the metadata below
+        form = request.form
+        form_data = {key: form[key] for key in UPLOAD_FORM_FIELDS if key in form}
         
-        if 'url' in request.form:
-            file_path, internal_name = process_url_request(request.form['url'])
+        if 'url' in form_data:
+            file_path, internal_name = process_url_request(form_data['url'])
             file = None  # No file object for URL-based uploads
             step_elapsed = time.time() - step_start
             logger.info(f"📥 URL processing completed in {step_elapsed:.3f}s")
+        elif form_data.get('save_to_s3', 'true').lower() != 'false' and not local_copy_required():
+            # Nothing below reads the file (no conversion, no ffprobe/thumbnail), so the
+            # request body goes straight to S3 without touching local disk
+            filename, internal_name, s3_url = stream_upload_to_s3()
+            file, file_path = None, None
+            step_elapsed = time.time() - step_start
+            logger.info(f"☁️ Streamed upload to S3 in {step_elapsed:.3f}s")
         else:
             # Validate and process the uploaded file
-            file, file_path, internal_name, save_to_s3 = process_upload_request()
+            file, file_path, internal_name, save_to_s3 = process_upload_request(form_data)
             step_elapsed = time.time() - step_start
             file_size = os.path.getsize(file_path) / (1024 * 1024)  # MB
             logger.info(f"📁 File upload processing completed in {step_elapsed:.3f}s ({file_size:.2f}MB)")
 
-        # Process video for web compatibility (convert H.265 to H.264 if needed)
-        compat_start = time.time()
-        logger.info(f"🔄 Starting video compatibility processing: {file_path}")
-        processed_file_path = process_video_for_web_compatibility(file_path)
-        compat_elapsed = time.time() - compat_start
+        if file_path is not None and ASYNC_POST_PROCESSING:
+            # The file is on local disk; web-compatibility conversion, storage, metadata,
+            # thumbnail and the database insert all run on the background pool and the
+            # client polls /upload/status/<job_id>. The job id is always server-generated;
+            # the video id (possibly client-chosen) is only a field on the job
+            job_id = str(uuid.uuid4())
+            video_id = form_data.setdefault('id', str(uuid.uuid4()))
+            create_upload_job(job_id, request.current_user_id, video_id)
+            run_in_background(
+                copy_current_request_context(run_upload_job),
+                job_id, file_path, internal_name, form_data, save_to_s3
+            )
+            total_elapsed = time.time() - upload_start_time
+            logger.info(f"📨 Upload accepted in {total_elapsed:.3f}s, processing queued as job {job_id}")
+            return jsonify({
+                "success": True,
+                "job_id": job_id,
+                "video_id": video_id,
+                "status": UPLOAD_JOB_PROCESSING,
+                "status_url": f"/upload/status/{job_id}"
+            }), 202
+
+        store_elapsed = 0.0
+        if file_path is not None:
+            store_start = time.time()
+            file_path, s3_url = store_upload(file_path, save_to_s3)
+            store_elapsed = time.time() - store_start
+
+        combined_metadata = finish_upload(file_path, internal_name, s3_url, form_data, save_to_s3, filename)
         
-        # Update the file path if conversion occurred
-        if processed_file_path != file_path:
-            logger.info(f"✅ Video converted from H.265 to H.264 in {compat_elapsed:.3f}s: {processed_file_path}")
-            file_path = processed_file_path
-        else:
-            logger.info(f"✅ Video compatibility check completed in {compat_elapsed:.3f}s")
+        # Calculate total time and log summary
+        total_elapsed = time.time() - upload_start_time
+        logger.info(f"🎉 UPLOAD COMPLETE! Total time: {total_elapsed:.3f}s")
+        logger.info(f"⏱️ Time breakdown: Upload: {step_elapsed:.3f}s | Compat + storage: {store_elapsed:.3f}s")
+        
+        return upload_response(combined_metadata)
+    except RequestEntityTooLarge as e:
+        # Bodies without a Content-Length are cut off while the form is parsed
+        return request_entity_too_large(e)
+    except ValueError as e:
+        # Invalid request (missing file, unsupported type, ...)
+        logger.warning(f"⚠️ Upload rejected: {e}")
+        return jsonify({"success": False, "error": str(e), "code": 400}), 400
+    except Exception as e:
+        total_elapsed = time.time() - upload_start_time
+        logger.error(f"❌ Upload failed after {total_elapsed:.3f}s: {e}")
+        return jsonify({"success": False, "error": str(e), "code": 500}), 500
+    
+def upload_response(combined_metadata):
+    """201 response for a stored upload, formatted to match the API documentation."""
+    return jsonify({
+        "success": True,
+        "metadata": {
+            "id": combined_metadata.get("_id", ""),
+            "title": combined_metadata.get("title", ""),
+            "description": combined_metadata.get("description", ""),
+            "s3_url": combined_metadata.get("s3_url", ""),
+            "thumbnail_id": combined_metadata.get("thumbnail_id", ""),
+            "duration": combined_metadata.get("duration", 0),
+            "resolution": combined_metadata.get("resolution", ""),
+            "upload_date": combined_metadata.get("upload_date", datetime.datetime.now().isoformat()),
+            "uploader": combined_metadata.get("uploader", "Anonymous")
+        }
+    }), 201
+
+def store_upload(file_path, save_to_s3):
+    """Make a local upload web compatible (H.265 -> H.264 if needed) and store it.
+    
+    :return: tuple of (file_path, s3_url) for the possibly converted file
+    """
+    # Process video for web compatibility (convert H.265 to H.264 if needed)
+    compat_start = time.time()
+    logger.info(f"🔄 Starting video compatibility processing: {file_path}")
+    processed_file_path = process_video_for_web_compatibility(file_path)
+    compat_elapsed = time.time() - compat_start
+    
+    # Update the file path if conversion occurred
+    if processed_file_path != file_path:
+        logger.info(f"✅ Video converted from H.265 to H.264 in {compat_elapsed:.3f}s: {processed_file_path}")
+        file_path = processed_file_path
+    else:
+        logger.info(f"✅ Video compatibility check completed in {compat_elapsed:.3f}s")
 
-        # Handle S3 or local saving (using the processed file)
-        storage_start = time.time()
-        s3_url = handle_file_storage(file, file_path, save_to_s3)
-        storage_elapsed = time.time() - storage_start
-        logger.info(f"☁️ File storage completed in {storage_elapsed:.3f}s (S3: {save_to_s3})")
+    # Handle S3 or local saving (using the processed file)
+    storage_start = time.time()
+    s3_url = handle_file_storage(None, file_path, save_to_s3)
+    storage_elapsed = time.time() - storage_start
+    logger.info(f"☁️ File storage completed in {storage_elapsed:.3f}s (S3: {save_to_s3})")
+    return file_path, s3_url
 
+def finish_upload(file_path, internal_name, s3_url, form_data, save_to_s3, filename=None):
+    """Run the stages after an upload is stored: metadata and thumbnail extraction,
+    the database insert, background H.265 handling and local file cleanup.
+    
+    :param file_path: Local copy of the video, or None if it was streamed straight to S3
+    :param filename: Stored file name, used for the fallback title when there is no local copy
+    :return: Combined metadata dict as saved to the database
+    """
+    metadata_elapsed = thumb_elapsed = 0.0
+    if file_path is None:
+        video_metadata = {
+            "duration": 0,
+            "resolution": "unknown",
+            "fps": 0,
+            "file_path": filename,
+            "thumbnail_bytes": None
+        }
+        thumbnail_id = None
+    else:
         # Extract video metadata
         metadata_start = time.time()
         video_metadata = extract_video_metadata(file_path)
         metadata_elapsed = time.time() - metadata_start
         logger.info(f"📊 Video metadata extraction completed in {metadata_elapsed:.3f}s")
 
-        # Save the thumbnail to GridFS and delete it locally
+        # Save the thumbnail to GridFS
         thumb_start = time.time()
         thumbnail_id = save_thumbnail_to_gridfs(video_metadata, internal_name)
         thumb_elapsed = time.time() - thumb_start
         logger.info(f"🖼️ Thumbnail GridFS storage completed in {thumb_elapsed:.3f}s")
 
-        # Combine metadata and save to MongoDB
-        db_start = time.time()
-        combined_metadata = combine_and_save_metadata(
-            video_metadata, request.form.to_dict(), internal_name, thumbnail_id, s3_url
-        )
-        db_elapsed = time.time() - db_start
-        logger.info(f"💾 Database metadata save completed in {db_elapsed:.3f}s")
-        
-        # Start async processing if we uploaded an H.265 file and it wasn't converted yet
-        # This handles the case where async processing is enabled
-        async_start = time.time()
-        video_id = combined_metadata.get("_id")
-        if video_id and os.path.exists(file_path):
-            from app.utils import detect_video_codec, ASYNC_PROCESSING
-            if ASYNC_PROCESSING:
-                codec = detect_video_codec(file_path)
-                if codec in ['hevc', 'h265']:
-                    logger.info(f"🔄 Starting async H.265 processing for video {video_id}")
-                    
-                    # Create S3 re-upload callback
-                    def s3_reupload_callback(converted_path):
-                        return upload_to_s3(converted_path, content_type='video/mp4')
-                    
-                    process_video_async(file_path, video_id, s3_reupload_callback)
-        async_elapsed = time.time() - async_start
-        logger.info(f"⚡ Async processing setup completed in {async_elapsed:.3f}s")
-        
-        # Now that all processing is done, schedule the local file for deletion
-        cleanup_start = time.time()
-        if save_to_s3 and os.path.exists(file_path):
-            logger.info(f"🗑️ Scheduling deletion of local file: {file_path}")
-            schedule_delete(file_path, delay=3600)  # Delete after 1 hour
-        cleanup_elapsed = time.time() - cleanup_start
-        
-        # Calculate total time and log summary
-        total_elapsed = time.time() - upload_start_time
-        logger.info(f"🎉 UPLOAD COMPLETE! Total time: {total_elapsed:.3f}s")
-        logger.info(f"⏱️ Time breakdown: Upload: {step_elapsed:.3f}s | Compat: {compat_elapsed:.3f}s | Storage: {storage_elapsed:.3f}s | Metadata: {metadata_elapsed:.3f}s | Thumb: {thumb_elapsed:.3f}s | DB: {db_elapsed:.3f}s | Async: {async_elapsed:.3f}s | Cleanup: {cleanup_elapsed:.3f}s")
-        
-        # Format response to match API documentation
-        response_data = {
-            "success": True,
-            "metadata": {
-                "id": combined_metadata.get("_id", ""),
-                "title": combined_metadata.get("title", ""),
-                "description": combined_metadata.get("description", ""),
-                "s3_url": combined_metadata.get("s3_url", ""),
-                "thumbnail_id": combined_metadata.get("thumbnail_id", ""),
-                "duration": combined_metadata.get("duration", 0),
-                "resolution": combined_metadata.get("resolution", ""),
-                "upload_date": combined_metadata.get("upload_date", datetime.datetime.now().isoformat()),
-                "uploader": combined_metadata.get("uploader", "Anonymous")
-            }
-        }
+    # Combine metadata and save to MongoDB
+    db_start = time.time()
+    combined_metadata = combine_and_save_metadata(
+        video_metadata, form_data, internal_name, thumbnail_id, s3_url
+    )
+    db_elapsed = time.time() - db_start
+    logger.info(f"💾 Database metadata save completed in {db_elapsed:.3f}s")
+    
+    # Start async processing if we uploaded an H.265 file and it wasn't converted yet
+    # This handles the case where async processing is enabled
+    async_start = time.time()
+    video_id = combined_metadata.get("_id")
+    if video_id and file_path and os.path.exists(file_path):
+        if ASYNC_PROCESSING:
+            codec = detect_video_codec(file_path)
+            if codec in ['hevc', 'h265']:
+                logger.info(f"🔄 Starting async H.265 processing for video {video_id}")
+                
+                # Create S3 re-upload callback
+                def s3_reupload_callback(converted_path):
+                    return upload_to_s3(converted_path, content_type='video/mp4')
+                
+                process_video_async(file_path, video_id, s3_reupload_callback)
+    async_elapsed = time.time() - async_start
+    logger.info(f"⚡ Async processing setup completed in {async_elapsed:.3f}s")
+    
+    # Now that all processing is done, schedule the local file for deletion
+    cleanup_start = time.time()
+    if save_to_s3 and file_path and os.path.exists(file_path):
+        logger.info(f"🗑️ Scheduling deletion of local file: {file_path}")
+        schedule_delete(file_path, delay=3600)  # Delete after 1 hour
+    cleanup_elapsed = time.time() - cleanup_start
+    
+    logger.info(f"⏱️ Post-processing breakdown: Metadata: {metadata_elapsed:.3f}s | Thumb: {thumb_elapsed:.3f}s | DB: {db_elapsed:.3f}s | Async: {async_elapsed:.3f}s | Cleanup: {cleanup_elapsed:.3f}s")
+    return combined_metadata
 
-        return jsonify(response_data), 201
+def run_upload_job(job_id, file_path, internal_name, form_data, save_to_s3):
+    """Background body of an ASYNC_POST_PROCESSING upload; records the outcome on the job."""
+    try:
+        file_path, s3_url = store_upload(file_path, save_to_s3)
+        combined_metadata = finish_upload(file_path, internal_name, s3_url, form_data, save_to_s3)
+        update_upload_job(job_id, UPLOAD_JOB_READY, video_id=combined_metadata.get("_id"))
+        logger.info(f"✅ Upload job {job_id} completed")
+    except DuplicateKeyError:
+        logger.error(f"❌ Upload job {job_id} failed: video id {form_data.get('id')} already exists")
+        update_upload_job(job_id, UPLOAD_JOB_FAILED, error="A video with this id already exists")
+        # Nothing references the stored copy
+        if os.path.exists(file_path):
+            schedule_delete(file_path, delay=0)
     except Exception as e:
-        total_elapsed = time.time() - upload_start_time
-        logger.error(f"❌ Upload failed after {total_elapsed:.3f}s: {e}")
-        return jsonify({"success": False, "error": str(e), "code": 500}), 500
-    
+        logger.error(f"❌ Upload job {job_id} failed: {e}")
+        update_upload_job(job_id, UPLOAD_JOB_FAILED, error=str(e))
+
+@app.route('/upload/status/<job_id>', methods=['GET'])
+@jwt_required
+def get_upload_status(job_id):
+    """Report the post-processing status of an upload accepted with 202."""
+    job = get_upload_job(job_id)
+    if not job or job.get("user_id") != request.current_user_id:
+        return jsonify({"success": False, "error": "Upload job not found", "code": 404}), 404
+    response_data = {"success": True, "job_id": job_id, "status": job.get("status")}
+    if job.get("video_id"):
+        response_data["video_id"] = job["video_id"]
+    if job.get("error"):
+        response_data["error"] = job["error"]
+    return jsonify(response_data), 200
+
 # Comments API endpoints
 @app.route('/comments/<video_id>', methods=['GET'])
 def get_comments(video_id):
     """Get all comments for a specific video."""
     try:
-        from app.database import comments_collection
-        
-        # Get top-level comments
-        top_comments = list(comments_collection.find({"videoId": video_id, "parent_comment_id": None}))
-        
-        # Process each comment to include replies
+        # Top-level comments with their replies joined in, in a single query
         result = []
-        for comment in top_comments:
-            comment_id = str(comment.get("_id"))
-            
-            # Convert ObjectId to string for JSON serialization
-            comment["_id"] = comment_id
-            
-            # Get replies for this comment
-            replies = list(comments_collection.find({"parent_comment_id": comment_id}))
-            for reply in replies:
-                reply["_id"] = str(reply.get("_id"))
+        for comment in fetch_comments_with_replies(video_id):
+            replies = comment.get("replies", [])
             
             # Format the comment according to API docs
             formatted_comment = {
-                "id": comment_id,
+                "id": str(comment.get("_id")),
                 "videoId": comment.get("videoId"),
                 "userId": comment.get("userId"),
                 "username": comment.get("username"),
@@ -335,8 +647,6 @@ def get_comments(video_id):
 def add_comment():
     """Add a new comment."""
     try:
-        from app.database import comments_collection
-        
         data = request.json
         if not data:
             return jsonify({"success": False, "error": "No data provided", "code": 400}), 400
@@ -384,9 +694,9 @@ def add_comment():
 def add_reply(comment_id):
     """Add a reply to a comment."""
     try:
-        from app.database import comments_collection
-        
         # Check if parent comment exists
+        if not is_object_id(comment_id):
+            return jsonify({"success": False, "error": "Parent comment not found", "code": 404}), 404
         parent = comments_collection.find_one({"_id": ObjectId(comment_id)})
         if not parent:
             return jsonify({"success": False, "error": "Parent comment not found", "code": 404}), 404
@@ -439,8 +749,6 @@ def add_reply(comment_id):
 def add_reaction():
     """Add or update a reaction to a video."""
     try:
-        from app.database import reactions_collection
-        
         data = request.json
         if not data:
             return jsonify({"success": False, "error": "No data provided", "code": 400}), 400
@@ -456,11 +764,7 @@ def add_reaction():
         reaction_type = data.get("type")
         
         # First check if the video exists before proceeding
-        video = get_single_document({"_id": video_id})
-        if not video:
-            # Try to find by short_id
-            video = get_single_document({"short_id": video_id})
-            
+        video = find_video(video_id, {"likes": 1, "dislikes": 1})
         if not video:
             logger.error(f"Cannot add reaction: Video with id {video_id} not found")
             return jsonify({"success": False, "error": "Video not found", "code": 404}), 404
@@ -472,76 +776,18 @@ def add_reaction():
         if reaction_type not in ["like", "dislike", "none"]:
             return jsonify({"success": False, "error": "Invalid reaction type", "code": 400}), 400
             
-        # Check if user already has a reaction
-        existing_reaction = reactions_collection.find_one({
-            "videoId": video_id,
-            "userId": user_id,
-            "commentId": None  # This is for a video, not a comment
-        })
-        
-        # Process based on the reaction type
-        if reaction_type == "none":
-            # Remove reaction if it exists
-            if existing_reaction:
-                reactions_collection.delete_one({"_id": existing_reaction["_id"]})
-                
-                # Update video like/dislike counts
-                old_type = existing_reaction.get("type")
-                if old_type == "like":
-                    update_db({"_id": actual_video_id}, {"$inc": {"likes": -1}})
-                elif old_type == "dislike":
-                    update_db({"_id": actual_video_id}, {"$inc": {"dislikes": -1}})
-        else:
-            # Add new reaction or update existing
-            if existing_reaction:
-                old_type = existing_reaction.get("type")
-                
-                # Only update if the reaction type is changing
-                if old_type != reaction_type:
-                    reactions_collection.update_one(
-                        {"_id": existing_reaction["_id"]},
-                        {"$set": {"type": reaction_type, "timestamp": data.get("timestamp", datetime.datetime.now().isoformat())}}
-                    )
-                    
-                    # Update video metrics
-                    if old_type == "like":
-                        update_db({"_id": actual_video_id}, {"$inc": {"likes": -1}})
-                    elif old_type == "dislike":
-                        update_db({"_id": actual_video_id}, {"$inc": {"dislikes": -1}})
-                        
-                    if reaction_type == "like":
-                        update_db({"_id": actual_video_id}, {"$inc": {"likes": 1}})
-                    elif reaction_type == "dislike":
-                        update_db({"_id": actual_video_id}, {"$inc": {"dislikes": 1}})
-            else:
-                # Create new reaction
-                reaction = {
-                    "videoId": video_id,
-                    "userId": user_id,
-                    "type": reaction_type,
-                    "commentId": None,
-                    "timestamp": data.get("timestamp", datetime.datetime.now().isoformat())
-                }
-                reactions_collection.insert_one(reaction)
-                
-                # Update video metrics
-                if reaction_type == "like":
-                    update_db({"_id": actual_video_id}, {"$inc": {"likes": 1}})
-                elif reaction_type == "dislike":
-                    update_db({"_id": actual_video_id}, {"$inc": {"dislikes": 1}})
-        
-        # Get current likes/dislikes count for the video
-        updated_video = get_single_document({"_id": actual_video_id})
-        
-        if not updated_video:
+        counts = apply_reaction(
+            get_collection(), actual_video_id,
+            {"videoId": video_id, "userId": user_id, "commentId": None},
+            reaction_type,
+            data.get("timestamp", datetime.datetime.now().isoformat())
+        )
+        if counts is None:
             logger.error(f"Video not found after updating: {video_id}")
             # Since we already verified the video exists above, we'll use the original video object
             # to avoid a 500 error, even if it has outdated counts
-            current_likes = video.get("likes", 0)
-            current_dislikes = video.get("dislikes", 0)
-        else:
-            current_likes = updated_video.get("likes", 0)
-            current_dislikes = updated_video.get("dislikes", 0)
+            counts = video.get("likes", 0), video.get("dislikes", 0)
+        current_likes, current_dislikes = counts
         
         return jsonify({
             "success": True,
@@ -557,10 +803,10 @@ def add_reaction():
 def add_comment_reaction(comment_id):
     """Add or update a reaction to a comment."""
     try:
-        from app.database import reactions_collection, comments_collection
-        
         # Check if comment exists
-        comment = comments_collection.find_one({"_id": ObjectId(comment_id)})
+        if not is_object_id(comment_id):
+            return jsonify({"success": False, "error": "Comment not found", "code": 404}), 404
+        comment = comments_collection.find_one({"_id": ObjectId(comment_id)}, {"_id": 1})
         if not comment:
             return jsonify({"success": False, "error": "Comment not found", "code": 404}), 404
             
@@ -581,67 +827,17 @@ def add_comment_reaction(comment_id):
         if reaction_type not in ["like", "dislike", "none"]:
             return jsonify({"success": False, "error": "Invalid reaction type", "code": 400}), 400
             
-        # Check if user already has a reaction to this comment
-        existing_reaction = reactions_collection.find_one({
-            "commentId": comment_id,
-            "userId": user_id
-        })
-        
-        # Process based on the reaction type
-        if reaction_type == "none":
-            # Remove reaction if it exists
-            if existing_reaction:
-                reactions_collection.delete_one({"_id": existing_reaction["_id"]})
-                
-                # Update comment like/dislike counts
-                old_type = existing_reaction.get("type")
-                if old_type == "like":
-                    comments_collection.update_one({"_id": ObjectId(comment_id)}, {"$inc": {"likes": -1}})
-                elif old_type == "dislike":
-                    comments_collection.update_one({"_id": ObjectId(comment_id)}, {"$inc": {"dislikes": -1}})
-        else:
-            # Add new reaction or update existing
-            if existing_reaction:
-                old_type = existing_reaction.get("type")
-                
-                # Only update if the reaction type is changing
-                if old_type != reaction_type:
-                    reactions_collection.update_one(
-                        {"_id": existing_reaction["_id"]},
-                        {"$set": {"type": reaction_type, "timestamp": data.get("timestamp", datetime.datetime.now().isoformat())}}
-                    )
-                    
-                    # Update comment metrics
-                    if old_type == "like":
-                        comments_collection.update_one({"_id": ObjectId(comment_id)}, {"$inc": {"likes": -1}})
-                    elif old_type == "dislike":
-                        comments_collection.update_one({"_id": ObjectId(comment_id)}, {"$inc": {"dislikes": -1}})
-                        
-                    if reaction_type == "like":
-                        comments_collection.update_one({"_id": ObjectId(comment_id)}, {"$inc": {"likes": 1}})
-                    elif reaction_type == "dislike":
-                        comments_collection.update_one({"_id": ObjectId(comment_id)}, {"$inc": {"dislikes": 1}})
-            else:
-                # Create new reaction
-                reaction = {
-                    "commentId": comment_id,
-                    "userId": user_id,
-                    "type": reaction_type,
-                    "videoId": None,
-                    "timestamp": data.get("timestamp", datetime.datetime.now().isoformat())
-                }
-                reactions_collection.insert_one(reaction)
-                
-                # Update comment metrics
-                if reaction_type == "like":
-                    comments_collection.update_one({"_id": ObjectId(comment_id)}, {"$inc": {"likes": 1}})
-                elif reaction_type == "dislike":
-                    comments_collection.update_one({"_id": ObjectId(comment_id)}, {"$inc": {"dislikes": 1}})
-        
-        # Get current likes/dislikes count for the comment
-        updated_comment = comments_collection.find_one({"_id": ObjectId(comment_id)})
-        current_likes = updated_comment.get("likes", 0)
-        current_dislikes = updated_comment.get("dislikes", 0)
+        counts = apply_reaction(
+            comments_collection, comment["_id"],
+            {"commentId": comment_id, "userId": user_id},
+            reaction_type,
+            data.get("timestamp", datetime.datetime.now().isoformat()),
+            {"videoId": None},
+            counter_writer=comment_counter_writer
+        )
+        if counts is None:
+            return jsonify({"success": False, "error": "Comment not found", "code": 404}), 404
+        current_likes, current_dislikes = counts
         
         return jsonify({
             "success": True,
@@ -658,9 +854,7 @@ def upload_thumbnail(video_id):
     """Upload a custom thumbnail for a video."""
     try:
         # Check if the video exists by _id or short_id
-        video = get_single_document({"_id": video_id})
-        if not video:
-            video = get_single_document({"short_id": video_id})
+        video = find_video(video_id, {"thumbnail_id": 1})
         if not video:
             return jsonify({"success": False, "error": "Video not found", "code": 404}), 404
             
@@ -675,19 +869,23 @@ def upload_thumbnail(video_id):
         if file.filename == '':
             return jsonify({"success": False, "error": "No file selected", "code": 400}), 400
             
-        # Save thumbnail to GridFS
-        thumbnail_id = fs.put(file, filename=f"{video_id}_custom_thumbnail.jpg")
+        # Save thumbnail to GridFS; thumbnails are small, so hand GridFS one bytes
+        # object to split into chunks rather than many small reads from the upload stream
+        thumbnail_id = put_thumbnail(file.read(), f"{video_id}_custom_thumbnail.jpg")
         
         # Update the video's thumbnail_id using the actual _id
-        update_db({"_id": actual_video_id}, {"$set": {"thumbnail_id": str(thumbnail_id)}})
+        update_db({"_id": actual_video_id}, {"$set": {"thumbnail_id": thumbnail_id}})
+        # The replaced thumbnail is no longer linked from the video
+        if video.get("thumbnail_id"):
+            evict_cached_thumbnail(video["thumbnail_id"])
         
         # Generate the thumbnail URL
-        thumbnail_url = f"{request.url_root.rstrip('/')}/thumbnail/{str(thumbnail_id)}"
+        thumbnail_url = f"{request.url_root.rstrip('/')}/thumbnail/{thumbnail_id}"
         
         return jsonify({
             "success": True,
             "videoId": actual_video_id,
-            "thumbnailId": str(thumbnail_id),
+            "thumbnailId": thumbnail_id,
             "url": thumbnail_url
         }), 200
     except Exception as e:
@@ -713,7 +911,7 @@ def save_video():
             return jsonify({"error": "Video ID is required"}), 400
         
         # Check if video exists
-        video = get_single_document({"_id": video_id}) or get_single_document({"short_id": video_id})
+        video = find_video(video_id, {"_id": 1})
         if not video:
             return jsonify({"error": "Video not found"}), 404
         
@@ -804,11 +1002,12 @@ def get_saved_videos():
             "userId": current_user_id
         }).sort("timestamp", -1))  # Most recent first
         
-        # Get full video details for each saved video
+        # Get full video details for all saved videos in one query
+        videos_by_id = get_many_by_ids([saved_video['videoId'] for saved_video in saved_videos])
         video_details = []
         for saved_video in saved_videos:
             video_id = saved_video['videoId']
-            video = get_single_document({"_id": video_id}) or get_single_document({"short_id": video_id})
+            video = videos_by_id.get(video_id)
             
             if video:
                 formatted_video = {
@@ -854,7 +1053,7 @@ def update_video(video_id):
             return jsonify({"error": "No JSON data provided"}), 400
         
         # Find the video
-        video = get_single_document({"_id": video_id}) or get_single_document({"short_id": video_id})
+        video = find_video(video_id, VIDEO_OWNER_FIELDS)
         if not video:
             return jsonify({"error": "Video not found"}), 404
         
@@ -921,7 +1120,7 @@ def delete_video(video_id):
         current_user_id = request.current_user_id  # Set by @jwt_required decorator
         
         # Find the video
-        video = get_single_document({"_id": video_id}) or get_single_document({"short_id": video_id})
+        video = find_video(video_id, {**VIDEO_OWNER_FIELDS, "thumbnail_id": 1})
         if not video:
             return jsonify({"error": "Video not found"}), 404
         
@@ -971,13 +1170,16 @@ def delete_video(video_id):
         # Delete saved video references
         saved_videos_collection.delete_many({"videoId": actual_id})
         
-        # Delete thumbnail from GridFS if it exists
+        # Delete thumbnail from GridFS if it exists and no other video shares it
+        # (identical thumbnails are stored once)
         thumbnail_id = video.get('thumbnail_id')
-        if thumbnail_id:
+        shared = thumbnail_id and get_collection().count_documents({"thumbnail_id": thumbnail_id}, limit=2) > 1
+        if thumbnail_id and is_object_id(thumbnail_id) and not shared:
             try:
                 fs.delete(ObjectId(thumbnail_id))
             except Exception as e:
                 logger.warning(f"Could not delete thumbnail {thumbnail_id}: {e}")
+            evict_cached_thumbnail(thumbnail_id)
         
         # Delete video metadata
         delete_from_db({"_id": actual_id})
@@ -1017,7 +1219,7 @@ def delete_comment(comment_id):
         
         # Get the video to check ownership
         video_id = comment.get('videoId')
-        video = get_single_document({"_id": video_id}) or get_single_document({"short_id": video_id})
+        video = find_video(video_id, VIDEO_OWNER_FIELDS)
         
         if not video:
             return jsonify({"error": "Video not found"}), 404
@@ -1087,7 +1289,7 @@ def delete_reply(reply_id):
         
         # Get the video to check ownership
         video_id = reply.get('videoId')
-        video = get_single_document({"_id": video_id}) or get_single_document({"short_id": video_id})
+        video = find_video(video_id, VIDEO_OWNER_FIELDS)
         
         if not video:
             return jsonify({"error": "Video not found"}), 404
@@ -1148,29 +1350,39 @@ def process_url_request(url):
     
     # Generate a unique name for the file
     internal_name = str(uuid.uuid4())
-    file_ext = url.split('.')[-1].split('?')[0] if '.' in url.split('/')[-1] else 'mp4'
+    # Take the extension from the URL path only, so query strings and host names never leak into it
+    file_ext = os.path.splitext(urlparse(url).path)[1][1:].lower()
+    if file_ext not in VIDEO_EXTENSIONS:
+        file_ext = 'mp4'
     file_path = os.path.join(app.config["UPLOAD_FOLDER"], f"{internal_name}.{file_ext}")
     
-    # Download the file in chunks to handle large files
+    # Large files from servers that accept byte ranges are fetched over several
+    # connections; anything else (or a failed part) uses a single stream
+    try:
+        if parallel_range_download(url, file_path):
+            logger.info(f"Successfully downloaded video from URL to: {file_path}")
+            return file_path, internal_name
+    except Exception as e:
+        logger.warning(f"Parallel download failed, retrying as a single stream: {e}")
+
+    # Stream the download to disk in 4MB blocks so memory stays bounded
     try:
-        with requests.get(url, stream=True) as response:
+        with http_session.get(url, stream=True) as response:
             response.raise_for_status()
-            with open(file_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+            # Undo any Content-Encoding (gzip etc.) while reading the raw stream
+            response.raw.decode_content = True
+            save_stream(response.raw, file_path, size=int(response.headers.get('Content-Length') or 0))
         logger.info(f"Successfully downloaded video from URL to: {file_path}")
         return file_path, internal_name
     except Exception as e:
         logger.error(f"Error downloading video from URL: {e}")
         raise
 
-def process_upload_request():
-    """Process an uploaded file from a multipart/form-data request.
+def uploaded_file():
+    """Return the uploaded file from a multipart/form-data request with a fresh storage name.
     
-    :return: tuple of (file, file_path, internal_name, save_to_s3)
+    :return: tuple of (file, internal_name, filename)
     """
-    logger.info("Processing file upload request")
-    
     # Check if the post request has the file part
     if 'file' not in request.files:
         logger.error("No file part in the request")
@@ -1183,35 +1395,49 @@ def process_upload_request():
         logger.error("No file selected for uploading")
         raise ValueError("No file selected for uploading")
         
+    file_ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else 'mp4'
+    if file_ext not in VIDEO_EXTENSIONS:
+        logger.error(f"Unsupported file type for upload: .{file_ext}")
+        raise ValueError(f"Unsupported file type: .{file_ext}")
+        
     # Generate a unique name for the file
     internal_name = str(uuid.uuid4())
-    file_ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else 'mp4'
-    filename = f"{internal_name}.{file_ext}"
+    return file, internal_name, f"{internal_name}.{file_ext}"
+
+def stream_upload_to_s3():
+    """Stream an uploaded file from the request body straight to S3, without a local copy.
+    
+    :return: tuple of (filename, internal_name, s3_url)
+    """
+    logger.info("Streaming file upload request to S3")
+    file, internal_name, filename = uploaded_file()
+    s3_url = upload_fileobj_to_s3(file.stream, filename)
+    if not s3_url:
+        # The request body has been consumed, so there is no local fallback
+        raise RuntimeError("Failed to upload file to S3")
+    return filename, internal_name, s3_url
+
+def process_upload_request(form_data):
+    """Process an uploaded file from a multipart/form-data request.
+    
+    :param form_data: The request's form fields, already read into a dict
+    :return: tuple of (file, file_path, internal_name, save_to_s3)
+    """
+    logger.info("Processing file upload request")
+    file, internal_name, filename = uploaded_file()
     file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
     
-    # Check for streaming threshold
-    content_length = request.content_length or 0
-    if content_length > app.config.get('MAX_CONTENT_LENGTH_FOR_STREAMING', 1024 * 1024):
-        logger.info(f"File size exceeds streaming threshold ({content_length} bytes). Using streaming upload.")
-        
-        # Stream the file to disk in chunks
-        try:
-            file.save(file_path)
-            logger.info(f"Successfully saved large file to: {file_path}")
-        except Exception as e:
-            logger.error(f"Error saving large file: {e}")
-            raise
-    else:
-        # For smaller files, use the standard approach
-        try:
-            file.save(file_path)
-            logger.info(f"Successfully saved file to: {file_path}")
-        except Exception as e:
-            logger.error(f"Error saving file: {e}")
-            raise
+    # Stream the upload to disk in 4MB blocks so memory stays bounded
+    try:
+        # The name is freshly generated, so create it exclusively rather than truncate
+        size = save_stream(file.stream, file_path, exclusive=True)
+        logger.info(f"Successfully saved file to: {file_path} ({size} bytes)")
+    except Exception as e:
+        logger.error(f"Error saving file: {e}")
+        raise
             
     # Determine if we should save to S3
-    save_to_s3 = request.form.get('save_to_s3', 'true').lower() != 'false'
+    save_to_s3 = form_data.get('save_to_s3', 'true').lower() != 'false'
     
     return file, file_path, internal_name, save_to_s3
 
@@ -1263,27 +1489,21 @@ def handle_file_storage(file, file_path, save_to_s3=True):
 def save_thumbnail_to_gridfs(video_metadata, internal_name):
     """Save thumbnail to GridFS and return its ID.
     
-    :param video_metadata: Metadata dict that contains the thumbnail path
+    :param video_metadata: Metadata dict that contains the thumbnail bytes
     :param internal_name: Internal name of the video
     :return: ObjectId of the saved thumbnail
     """
     logger.info("Saving thumbnail to GridFS")
     
-    thumbnail_path = video_metadata.get('thumbnail_path')
-    if not thumbnail_path or not os.path.exists(thumbnail_path):
+    thumbnail_bytes = video_metadata.get('thumbnail_bytes')
+    if not thumbnail_bytes:
         logger.warning("No thumbnail available")
         return None
         
     try:
-        with open(thumbnail_path, 'rb') as f:
-            thumbnail_id = fs.put(f, filename=f"{internal_name}_thumbnail.jpg")
+        thumbnail_id = put_thumbnail(thumbnail_bytes, f"{internal_name}_thumbnail.jpg")
         logger.info(f"Thumbnail saved to GridFS with ID: {thumbnail_id}")
-        
-        # Delete local thumbnail file as it's now in GridFS
-        os.remove(thumbnail_path)
-        logger.info(f"Local thumbnail file deleted: {thumbnail_path}")
-        
-        return str(thumbnail_id)
+        return thumbnail_id
     except Exception as e:
         logger.error(f"Error saving thumbnail to GridFS: {e}")
         return None
@@ -1304,8 +1524,7 @@ def combine_and_save_metadata(video_metadata, form_data, internal_name, thumbnai
     players = []
     if form_data.get('players'):
         try:
-            import json
-            players = json.loads(form_data.get('players', '[]'))
+            players = orjson.loads(form_data.get('players', '[]'))
         except Exception as e:
             logger.error(f"Error parsing players JSON: {e}")
     
@@ -1350,15 +1569,84 @@ def combine_and_save_metadata(video_metadata, form_data, internal_name, thumbnai
     }
     
     # Save to database
-    save_to_db(metadata)
+    save_metadata(metadata)
     logger.info(f"Metadata saved to database with ID: {metadata['_id']}")
     
     return metadata
 
 def generate_short_id(length=8):
     """Generate a short, unique, URL-safe ID."""
-    chars = string.ascii_letters + string.digits
-    return ''.join(random.choices(chars, k=length))
+    # Each random byte encodes to 4/3 base64 characters
+    return secrets.token_urlsafe((length * 3 + 3) // 4)[:length]
+
+# In-order chunks are appended to this file in the upload directory as they arrive;
+# only chunks that arrive ahead of their turn are kept as separate chunk_<i> files
+CHUNK_ASSEMBLY_NAME = "assembly"
+
+# S3 part uploads started by /upload/chunk in this process, per fileId, for /upload/finalize to wait on
+_pending_part_uploads = {}
+_pending_part_uploads_lock = threading.Lock()
+
+# Per-chunk bookkeeping lives in a fixed 16-byte file next to the write-once
+# metadata.json: chunksReceived and nextSequential as little-endian uint64s
+CHUNK_COUNTERS_NAME = "counter.bin"
+_CHUNK_COUNTERS = struct.Struct('<QQ')
+
+# Seconds between attempts to take a busy counter lock
+CHUNK_LOCK_RETRY_DELAY = 0.01
+
+class StaleChunkUpload(Exception):
+    """A chunked upload directory without counter.bin, started before it was introduced."""
+
+@contextmanager
+def locked_chunk_counters(upload_dir):
+    """Yield a chunked upload's counters under an exclusive flock and store them back.
+
+    Chunks of one upload can arrive concurrently; the flock keeps their updates from
+    overwriting each other. The counter file is created by /upload/init only; raises
+    StaleChunkUpload if it is missing rather than restarting the counts from zero.
+    """
+    try:
+        fd = os.open(os.path.join(upload_dir, CHUNK_COUNTERS_NAME), os.O_RDWR)
+    except FileNotFoundError:
+        raise StaleChunkUpload("Upload session is out of date; restart the upload from /upload/init")
+    try:
+        # A blocking flock would stall the whole gevent worker, including the greenlet
+        # holding the lock, so poll instead; time.sleep yields to other greenlets
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                time.sleep(CHUNK_LOCK_RETRY_DELAY)
+        data = os.pread(fd, _CHUNK_COUNTERS.size, 0)
+        received, next_sequential = _CHUNK_COUNTERS.unpack(data)
+        counters = {"chunksReceived": received, "nextSequential": next_sequential}
+        yield counters
+        os.pwrite(fd, _CHUNK_COUNTERS.pack(counters["chunksReceived"], counters["nextSequential"]), 0)
+    finally:
+        os.close(fd)
+
+def append_ready_chunks(upload_dir, counters):
+    """Move buffered out-of-order chunks that are now next in line onto the assembly file.
+
+    Must be called under locked_chunk_counters. chunk_<i> files only ever appear
+    complete (they are renamed into place under the same lock).
+    """
+    assembly_path = os.path.join(upload_dir, CHUNK_ASSEMBLY_NAME)
+    while True:
+        chunk_path = os.path.join(upload_dir, f"chunk_{counters['nextSequential']}")
+        if not os.path.exists(chunk_path):
+            return
+        run_blocking(append_file, chunk_path, assembly_path)
+        os.unlink(chunk_path)
+        counters["nextSequential"] += 1
+
+def multipart_chunks_fit(file_size, total_chunks):
+    """True if the announced chunks can be sent to S3 as multipart parts as they arrive."""
+    if total_chunks < 1 or total_chunks > MAX_MULTIPART_PARTS:
+        return False
+    return total_chunks == 1 or file_size // total_chunks >= MIN_MULTIPART_PART_SIZE
 
 @app.route('/upload/init', methods=['POST'])
 @jwt_required
@@ -1386,7 +1674,6 @@ def init_chunked_upload():
             "filename": request.form.get('filename', ''),
             "fileSize": request.form.get('fileSize', '0'),
             "totalChunks": request.form.get('totalChunks', '0'),
-            "chunksReceived": 0,
             "title": request.form.get('title', ''),
             "description": request.form.get('description', ''),
             "uploader": request.form.get('uploader', 'Anonymous'),
@@ -1394,11 +1681,33 @@ def init_chunked_upload():
             "status": "initialized",
             "created_at": datetime.datetime.now().isoformat()
         }
+
+        # When nothing needs a local copy of the video, each chunk becomes an S3 multipart
+        # part as it arrives and the file is never assembled on disk
+        try:
+            file_size, total_chunks = int(metadata["fileSize"]), int(metadata["totalChunks"])
+        except ValueError:
+            file_size = total_chunks = 0
+        if not local_copy_required() and multipart_chunks_fit(file_size, total_chunks):
+            filename = metadata["filename"]
+            file_ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else 'mp4'
+            internal_name = str(uuid.uuid4())
+            s3_key = f"{internal_name}.{file_ext}"
+            upload_id = create_multipart_upload(s3_key)
+            if upload_id:
+                metadata.update({
+                    "internalName": internal_name,
+                    "s3Key": s3_key,
+                    "s3UploadId": upload_id
+                })
+            else:
+                logger.warning(f"⚠️ Falling back to local chunk assembly for {file_id}")
         
-        # Save metadata to a JSON file
-        with open(os.path.join(upload_dir, "metadata.json"), 'w') as f:
-            import json
-            json.dump(metadata, f)
+        # Save metadata to a JSON file; it is not rewritten while chunks arrive
+        with open(os.path.join(upload_dir, "metadata.json"), 'wb') as f:
+            f.write(orjson.dumps(metadata))
+        with open(os.path.join(upload_dir, CHUNK_COUNTERS_NAME), 'wb') as f:
+            f.write(_CHUNK_COUNTERS.pack(0, 0))
             
         logger.info(f"Chunked upload initialized with ID: {file_id}")
         
@@ -1443,35 +1752,148 @@ def upload_chunk():
             logger.error(f"Upload directory not found for fileId: {file_id}")
             return jsonify({"success": False, "error": "Upload not initialized", "code": 400}), 400
             
-        # Save this chunk to the upload directory
-        chunk_path = os.path.join(upload_dir, f"chunk_{chunk_index}")
-        file.save(chunk_path)
-        
-        # Update metadata
-        import json
         metadata_path = os.path.join(upload_dir, "metadata.json")
-        with open(metadata_path, 'r') as f:
-            metadata = json.load(f)
-            
-        metadata["chunksReceived"] = metadata.get("chunksReceived", 0) + 1
-        
-        with open(metadata_path, 'w') as f:
-            json.dump(metadata, f)
+        with open(metadata_path, 'rb') as f:
+            upload_info = orjson.loads(f.read())
+
+        # Chunk files are always named from the parsed index, so "01" and "1" are the same chunk
+        try:
+            index = int(chunk_index)
+            expected_chunks = int(upload_info.get("totalChunks") or total_chunks)
+        except ValueError:
+            logger.error(f"Invalid chunk index {chunk_index!r} for fileId: {file_id}")
+            return jsonify({"success": False, "error": "chunkIndex and totalChunks must be integers", "code": 400}), 400
+        if not 0 <= index < expected_chunks:
+            logger.error(f"Chunk index {index} out of range for fileId: {file_id}")
+            return jsonify({"success": False, "error": f"chunkIndex must be between 0 and {expected_chunks - 1}", "code": 400}), 400
+
+        if upload_info.get("s3UploadId"):
+            # Land the chunk on disk and send it to S3 as its multipart part in the
+            # background, so the server-to-S3 transfer overlaps the rest of the client upload.
+            # It is spooled under a private name and renamed into place under the counter
+            # lock, so chunk_<i> is written once and never changes under a running part upload
+            chunk_path = os.path.join(upload_dir, f"chunk_{index}")
+            part_path = f"{chunk_path}.{uuid.uuid4().hex}.part"
+            save_stream(file.stream, part_path, exclusive=True)
+            try:
+                with locked_chunk_counters(upload_dir) as counters:
+                    retry = os.path.exists(chunk_path)
+                    if retry:
+                        # Its part is already uploading (or will be sent again by finalize)
+                        logger.info(f"Chunk {index} for file ID {file_id} already received, ignoring retry")
+                        os.unlink(part_path)
+                    else:
+                        os.replace(part_path, chunk_path)
+                        counters["chunksReceived"] += 1
+            except BaseException:
+                try:
+                    os.unlink(part_path)
+                except FileNotFoundError:
+                    pass
+                raise
+
+            if not retry:
+                def record_part(etag, chunk_path=chunk_path):
+                    # Written aside and renamed so a reader never sees a partial ETag
+                    with open(f"{chunk_path}.etag.tmp", 'w') as f:
+                        f.write(etag)
+                    os.replace(f"{chunk_path}.etag.tmp", f"{chunk_path}.etag")
+
+                future = upload_part_from_file_async(
+                    upload_info["s3Key"], upload_info["s3UploadId"], index + 1, chunk_path, record_part
+                )
+                with _pending_part_uploads_lock:
+                    _pending_part_uploads.setdefault(file_id, []).append(future)
+        else:
+            # Spool the request body under a private name first, so the counter lock is
+            # never held while waiting on the client
+            chunk_path = os.path.join(upload_dir, f"chunk_{index}")
+            part_path = f"{chunk_path}.{uuid.uuid4().hex}.part"
+            save_stream(file.stream, part_path, exclusive=True)
+            try:
+                with locked_chunk_counters(upload_dir) as counters:
+                    if index < counters["nextSequential"] or os.path.exists(chunk_path):
+                        # A retry of a chunk that was already taken: keep the first copy
+                        # and don't count it twice
+                        logger.info(f"Chunk {index} for file ID {file_id} already received, ignoring retry")
+                        os.unlink(part_path)
+                    elif index == counters["nextSequential"]:
+                        # The common case: append the chunk to the assembly file
+                        run_blocking(append_file, part_path, os.path.join(upload_dir, CHUNK_ASSEMBLY_NAME))
+                        os.unlink(part_path)
+                        counters["nextSequential"] += 1
+                        counters["chunksReceived"] += 1
+                        append_ready_chunks(upload_dir, counters)
+                    else:
+                        # Ahead of its turn: publish it under its final name now that it is
+                        # complete, and keep it aside until the chunks before it arrive
+                        os.replace(part_path, chunk_path)
+                        counters["chunksReceived"] += 1
+            except BaseException:
+                # Don't leave the spooled copy behind when the chunk was not taken
+                try:
+                    os.unlink(part_path)
+                except FileNotFoundError:
+                    pass
+                raise
             
-        logger.info(f"Chunk {chunk_index} of {total_chunks} saved for file ID {file_id}")
+        logger.info(f"Chunk {index} of {total_chunks} saved for file ID {file_id}")
         
         return jsonify({
             "success": True,
             "fileId": file_id,
             "chunkIndex": chunk_index,
-            "chunksReceived": metadata["chunksReceived"],
+            "chunksReceived": counters["chunksReceived"],
             "totalChunks": total_chunks
         }), 200
         
+    except StaleChunkUpload as e:
+        logger.warning(f"⚠️ Chunk rejected: {e}")
+        return jsonify({"success": False, "error": str(e), "code": 409}), 409
     except Exception as e:
         logger.error(f"Error uploading chunk: {e}")
         return jsonify({"success": False, "error": str(e), "code": 500}), 500
         
+def finalize_multipart_upload(upload_dir, metadata):
+    """Finish a chunked upload whose chunks were sent to S3 as multipart parts."""
+    file_id, s3_key, upload_id = metadata["fileId"], metadata["s3Key"], metadata["s3UploadId"]
+    with _pending_part_uploads_lock:
+        futures = _pending_part_uploads.pop(file_id, [])
+    _, not_done = wait(futures, timeout=S3_PART_WAIT_TIMEOUT)
+    if not_done:
+        logger.warning(f"⚠️ {len(not_done)} part upload(s) for {file_id} still running after {S3_PART_WAIT_TIMEOUT}s, sending them again")
+
+    # Parts whose background upload failed, is stuck, or is still running in another
+    # worker process, are sent again from their chunk file; identical bytes give the same ETag
+    parts = []
+    for i in range(int(metadata["totalChunks"])):
+        chunk_path = os.path.join(upload_dir, f"chunk_{i}")
+        try:
+            with open(f"{chunk_path}.etag") as f:
+                etag = f.read()
+        except FileNotFoundError:
+            with open(chunk_path, 'rb') as body:
+                etag = upload_part(s3_key, upload_id, i + 1, body)
+        parts.append({"PartNumber": i + 1, "ETag": etag})
+    s3_url = complete_multipart_upload(s3_key, upload_id, parts)
+    if not s3_url:
+        abort_multipart_upload(s3_key, upload_id)
+        schedule_delete(upload_dir, delay=0)
+        return jsonify({"success": False, "error": "Failed to store file in S3", "code": 500}), 500
+
+    form_data = {
+        "title": request.form.get('title', metadata.get("title", "")),
+        "description": request.form.get('description', metadata.get("description", "")),
+        "uploader": request.form.get('uploader', metadata.get("uploader", "Anonymous")),
+        "players": request.form.get('players', metadata.get("players", "[]"))
+    }
+    combined_metadata = finish_upload(None, metadata["internalName"], s3_url, form_data, True, s3_key)
+
+    # The chunk files were only kept to retry parts; the object in S3 is now complete
+    logger.info(f"Deleting chunks directory: {upload_dir}")
+    schedule_delete(upload_dir, delay=0)
+    return upload_response(combined_metadata)
+
 @app.route('/upload/finalize', methods=['POST'])
 @jwt_required
 def finalize_upload():
@@ -1495,13 +1917,14 @@ def finalize_upload():
             return jsonify({"success": False, "error": "Upload not initialized", "code": 400}), 400
             
         # Load metadata
-        import json
         metadata_path = os.path.join(upload_dir, "metadata.json")
-        with open(metadata_path, 'r') as f:
-            metadata = json.load(f)
+        with open(metadata_path, 'rb') as f:
+            metadata = orjson.loads(f.read())
             
         # Check if all chunks have been received
-        chunks_received = metadata.get("chunksReceived", 0)
+        with locked_chunk_counters(upload_dir) as counters:
+            chunks_received = counters["chunksReceived"]
+            next_sequential = counters["nextSequential"]
         total_chunks = int(metadata.get("totalChunks", "0"))
         
         if chunks_received != total_chunks:
@@ -1512,30 +1935,37 @@ def finalize_upload():
                 "code": 400
             }), 400
             
+        if metadata.get("s3UploadId"):
+            return finalize_multipart_upload(upload_dir, metadata)
+
         # Generate a name for the complete file
         original_filename = request.form.get('filename', metadata.get("filename", ""))
         file_ext = original_filename.rsplit('.', 1)[1].lower() if '.' in original_filename else 'mp4'
         internal_name = str(uuid.uuid4())
         complete_file_path = os.path.join(app.config["UPLOAD_FOLDER"], f"{internal_name}.{file_ext}")
         
-        # Combine all chunks into the complete file
-        with open(complete_file_path, 'wb') as outfile:
-            for i in range(total_chunks):
-                chunk_path = os.path.join(upload_dir, f"chunk_{i}")
-                
-                if not os.path.exists(chunk_path):
-                    logger.error(f"Chunk {i} not found at {chunk_path}")
-                    return jsonify({"success": False, "error": f"Chunk {i} not found", "code": 400}), 400
-                
-                with open(chunk_path, 'rb') as infile:
-                    outfile.write(infile.read())
+        # Combine the assembly file and any chunks not yet appended to it into the complete file
+        chunk_paths = [os.path.join(upload_dir, CHUNK_ASSEMBLY_NAME)] if next_sequential else []
+        for i in range(next_sequential, total_chunks):
+            chunk_path = os.path.join(upload_dir, f"chunk_{i}")
+            
+            if not os.path.exists(chunk_path):
+                logger.error(f"Chunk {i} not found at {chunk_path}")
+                return jsonify({"success": False, "error": f"Chunk {i} not found", "code": 400}), 400
+            
+            chunk_paths.append(chunk_path)
+        if len(chunk_paths) == 1:
+            # Usually every chunk was appended in order and the file is already complete
+            os.replace(chunk_paths[0], complete_file_path)
+        else:
+            assemble_chunks(chunk_paths, complete_file_path)
                     
         logger.info(f"All chunks combined into complete file: {complete_file_path}")
         
         # Update metadata status
         metadata["status"] = "combined"
-        with open(metadata_path, 'w') as f:
-            json.dump(metadata, f)
+        with open(metadata_path, 'wb') as f:
+            f.write(orjson.dumps(metadata))
             
         # Now process the complete file similar to the regular upload endpoint
         save_to_s3 = True
@@ -1574,7 +2004,6 @@ def finalize_upload():
         # Start async processing for chunked uploads too
         video_id = combined_metadata.get("_id")
         if video_id and os.path.exists(complete_file_path):
-            from app.utils import detect_video_codec, ASYNC_PROCESSING
             if ASYNC_PROCESSING:
                 codec = detect_video_codec(complete_file_path)
                 if codec in ['hevc', 'h265']:
@@ -1595,24 +2024,11 @@ def finalize_upload():
         logger.info(f"Scheduling deletion of chunks directory: {upload_dir}")
         schedule_delete(upload_dir, delay=3600)  # Delete after 1 hour
         
-        # Format response to match API documentation
-        response_data = {
-            "success": True,
-            "metadata": {
-                "id": combined_metadata.get("_id", ""),
-                "title": combined_metadata.get("title", ""),
-                "description": combined_metadata.get("description", ""),
-                "s3_url": combined_metadata.get("s3_url", ""),
-                "thumbnail_id": combined_metadata.get("thumbnail_id", ""),
-                "duration": combined_metadata.get("duration", 0),
-                "resolution": combined_metadata.get("resolution", ""),
-                "upload_date": combined_metadata.get("upload_date", datetime.datetime.now().isoformat()),
-                "uploader": combined_metadata.get("uploader", "Anonymous")
-            }
-        }
-        
-        return jsonify(response_data), 201
+        return upload_response(combined_metadata)
         
+    except StaleChunkUpload as e:
+        logger.warning(f"⚠️ Finalize rejected: {e}")
+        return jsonify({"success": False, "error": str(e), "code": 409}), 409
     except Exception as e:
         logger.error(f"Error finalizing chunked upload: {e}")
         return jsonify({"success": False, "error": str(e), "code": 500}), 500
\ No newline at end of file
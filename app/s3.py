@@ -2,25 +2,99 @@ import os
 import boto3
 import mimetypes
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
 from botocore.exceptions import ClientError
-from app.config import AWS_ACCESS_KEY, AWS_SECRET_KEY, S3_BUCKET_NAME, S3_REGION
+from app.config import AWS_ACCESS_KEY, AWS_SECRET_KEY, S3_BUCKET_NAME, S3_REGION, S3_PART_UPLOAD_WORKERS
+from app.utils import run_in_background
 import logging
-import threading
 from boto3.s3.transfer import TransferConfig
 
-# Configure logger
+# Logging is configured once in app/__init__.py
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
 # S3 Transfer configuration for better performance
 MB = 1024 * 1024
 transfer_config = TransferConfig(
-    multipart_threshold=64 * MB,  # Use multipart for files larger than 64MB
+    multipart_threshold=16 * MB,  # Use multipart (parallel parts) once a file spans more than one chunk
     max_concurrency=10,           # Use up to 10 threads for concurrent uploads
-    multipart_chunksize=64 * MB,  # 64MB per chunk
+    multipart_chunksize=16 * MB,  # 16MB per chunk
+    io_chunksize=1 * MB,          # Read the local file in 1MB blocks instead of 256KB
     use_threads=True              # Enable threading
 )
 
+# Smaller parts for streamed request bodies (profile pictures etc.)
+stream_transfer_config = TransferConfig(
+    multipart_threshold=8 * MB,
+    max_concurrency=8,
+    multipart_chunksize=8 * MB,
+    use_threads=True
+)
+
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+def get_s3_client():
+    """Return the process-wide boto3 S3 client, creating it on first use
+
+    boto3 clients are thread-safe, so every request and transfer thread shares one
+    client and its pool of keep-alive connections.
+    """
+    global _s3_client
+    if _s3_client is None:
+        with _s3_client_lock:
+            if _s3_client is None:
+                _s3_client = boto3.client(
+                    's3',
+                    region_name=S3_REGION,
+                    aws_access_key_id=AWS_ACCESS_KEY,
+                    aws_secret_access_key=AWS_SECRET_KEY,
+                    # Room for several concurrent transfers of max_concurrency threads each
+                    config=Config(max_pool_connections=50)
+                )
+    return _s3_client
+
+def s3_object_url(object_name):
+    """Public URL of an object in the configured bucket"""
+    return f"https://{S3_BUCKET_NAME}.s3.{S3_REGION}.amazonaws.com/{object_name}"
+
+def generate_presigned_upload(object_name, content_type, max_bytes, expires_in=300):
+    """Presign a POST so a client can upload an object directly to S3
+
+    S3 itself rejects uploads with another content type or a body outside
+    1..max_bytes, so the URL can't be used to store arbitrary data.
+
+    :param object_name: S3 object name the client will write
+    :param content_type: Content type the client must send with the upload
+    :param max_bytes: Largest object S3 accepts for this upload
+    :param expires_in: Policy lifetime in seconds
+    :return: Dict with the form `url` and `fields`, or None if error
+    """
+    try:
+        return get_s3_client().generate_presigned_post(
+            S3_BUCKET_NAME,
+            object_name,
+            Fields={'Content-Type': content_type},
+            Conditions=[
+                {'Content-Type': content_type},
+                ['content-length-range', 1, max_bytes]
+            ],
+            ExpiresIn=expires_in
+        )
+    except Exception as e:
+        logger.error(f"❌ Failed to presign upload for {object_name}: {e}")
+        return None
+
+def head_s3_object(object_name):
+    """HEAD an object in the bucket; returns its metadata, or None if it doesn't exist"""
+    try:
+        return get_s3_client().head_object(Bucket=S3_BUCKET_NAME, Key=object_name)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') not in ('404', 'NoSuchKey', 'NotFound'):
+            logger.error(f"❌ Failed to look up {object_name}: {e}")
+        return None
+
 def upload_to_s3(file_path, object_name=None, content_type=None):
     """Upload a file to an S3 bucket and return the URL
 
@@ -58,18 +132,12 @@ def upload_to_s3(file_path, object_name=None, content_type=None):
     # Log AWS configuration details (without exposing sensitive information)
     logger.info(f"🌐 Target: {S3_REGION}/{S3_BUCKET_NAME}")
 
-    # Create a boto3 client
+    # Get the shared boto3 client (created on the first upload)
     client_start = time.time()
     try:
-        logger.info("🔧 Creating S3 client...")
-        s3_client = boto3.client(
-            's3',
-            region_name=S3_REGION,
-            aws_access_key_id=AWS_ACCESS_KEY,
-            aws_secret_access_key=AWS_SECRET_KEY
-        )
+        s3_client = get_s3_client()
         client_elapsed = time.time() - client_start
-        logger.info(f"✅ S3 client created in {client_elapsed:.3f}s")
+        logger.info(f"✅ S3 client ready in {client_elapsed:.3f}s")
     except Exception as e:
         elapsed = time.time() - upload_start_time
         logger.error(f"❌ Failed to create S3 client after {elapsed:.3f}s: {e}")
@@ -86,7 +154,7 @@ def upload_to_s3(file_path, object_name=None, content_type=None):
         actual_upload_start = time.time()
         logger.info(f"🚀 Starting upload to S3: {object_name}")
         
-        if file_size > 64 * MB:
+        if file_size > transfer_config.multipart_threshold:
             logger.info(f"📤 Large file detected ({file_size_mb:.2f}MB), using multipart upload")
         
         s3_client.upload_file(
@@ -102,7 +170,7 @@ def upload_to_s3(file_path, object_name=None, content_type=None):
         logger.info(f"📤 Upload completed in {actual_upload_elapsed:.3f}s ({upload_speed:.2f} MB/s)")
 
         # Generate the URL
-        url = f"https://{S3_BUCKET_NAME}.s3.{S3_REGION}.amazonaws.com/{object_name}"
+        url = s3_object_url(object_name)
         
         total_elapsed = time.time() - upload_start_time
         logger.info(f"🎉 S3 upload process completed in {total_elapsed:.3f}s total")
@@ -118,9 +186,150 @@ def upload_to_s3(file_path, object_name=None, content_type=None):
         logger.error(f"❌ S3 upload failed after {elapsed:.3f}s: {e}")
         return None
 
+def upload_fileobj_to_s3(fileobj, object_name, content_type=None):
+    """Stream a file-like object (e.g. a Werkzeug FileStorage stream) to S3 and return the URL
+
+    :param fileobj: Readable binary file-like object
+    :param object_name: S3 object name
+    :param content_type: Optional content type (guessed from object_name if missing)
+    :return: Public URL of the uploaded object or None if error
+    """
+    upload_start_time = time.time()
+    logger.info(f"☁️ Starting streamed S3 upload: {object_name}")
+
+    if content_type is None:
+        content_type = get_content_type(object_name)
+
+    try:
+        s3_client = get_s3_client()
+        s3_client.upload_fileobj(
+            fileobj,
+            S3_BUCKET_NAME,
+            object_name,
+            ExtraArgs={
+                'ContentType': content_type,
+                'CacheControl': 'max-age=31536000'
+            },
+            Config=stream_transfer_config
+        )
+    except ClientError as e:
+        elapsed = time.time() - upload_start_time
+        logger.error(f"❌ S3 ClientError after {elapsed:.3f}s: {e}")
+        return None
+    except Exception as e:
+        elapsed = time.time() - upload_start_time
+        logger.error(f"❌ Streamed S3 upload failed after {elapsed:.3f}s: {e}")
+        return None
+
+    url = s3_object_url(object_name)
+    logger.info(f"🎉 Streamed S3 upload completed in {time.time() - upload_start_time:.3f}s: {url}")
+    return url
+
+# S3 rejects multipart parts under 5 MiB (except the last one) and uploads of more than 10,000 parts
+MIN_MULTIPART_PART_SIZE = 5 * MB
+MAX_MULTIPART_PARTS = 10000
+
+def create_multipart_upload(object_name, content_type=None):
+    """Start a multipart upload whose parts are sent one by one with upload_part
+
+    :param object_name: S3 object name
+    :param content_type: Optional content type (guessed from object_name if missing)
+    :return: UploadId or None if error
+    """
+    if content_type is None:
+        content_type = get_content_type(object_name)
+    try:
+        response = get_s3_client().create_multipart_upload(
+            Bucket=S3_BUCKET_NAME,
+            Key=object_name,
+            ContentType=content_type,
+            CacheControl='max-age=31536000'
+        )
+    except Exception as e:
+        logger.error(f"❌ Failed to start multipart upload for {object_name}: {e}")
+        return None
+    logger.info(f"🧩 Started multipart upload for {object_name}")
+    return response['UploadId']
+
+def upload_part(object_name, upload_id, part_number, body):
+    """Upload one part of a multipart upload and return its ETag
+
+    :param body: Seekable binary file-like object holding the part
+    """
+    response = get_s3_client().upload_part(
+        Bucket=S3_BUCKET_NAME,
+        Key=object_name,
+        UploadId=upload_id,
+        PartNumber=part_number,
+        Body=body
+    )
+    return response['ETag']
+
+_part_upload_pool = None
+_part_upload_pool_lock = threading.Lock()
+
+def upload_part_from_file_async(object_name, upload_id, part_number, file_path, on_uploaded=None):
+    """Upload a part stored in file_path on a dedicated background pool
+
+    :param on_uploaded: Optional callable run with the ETag before the returned Future resolves
+    :return: Future resolving to the part's ETag
+    """
+    global _part_upload_pool
+    if _part_upload_pool is None:
+        with _part_upload_pool_lock:
+            if _part_upload_pool is None:
+                _part_upload_pool = ThreadPoolExecutor(
+                    max_workers=S3_PART_UPLOAD_WORKERS, thread_name_prefix='s3-part'
+                )
+
+    def upload():
+        try:
+            with open(file_path, 'rb') as body:
+                etag = upload_part(object_name, upload_id, part_number, body)
+        except Exception as e:
+            logger.error(f"❌ Background upload of part {part_number} of {object_name} failed: {e}")
+            raise
+        if on_uploaded:
+            on_uploaded(etag)
+        return etag
+
+    return _part_upload_pool.submit(upload)
+
+def complete_multipart_upload(object_name, upload_id, parts):
+    """Assemble the uploaded parts into the final object and return its URL
+
+    :param parts: List of {'PartNumber': ..., 'ETag': ...} dicts
+    :return: Public URL of the object or None if error
+    """
+    try:
+        get_s3_client().complete_multipart_upload(
+            Bucket=S3_BUCKET_NAME,
+            Key=object_name,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': sorted(parts, key=lambda part: part['PartNumber'])}
+        )
+    except Exception as e:
+        logger.error(f"❌ Failed to complete multipart upload for {object_name}: {e}")
+        return None
+    url = s3_object_url(object_name)
+    logger.info(f"🎉 Multipart upload completed: {url}")
+    return url
+
+def abort_multipart_upload(object_name, upload_id):
+    """Discard a multipart upload and the parts stored for it so far"""
+    try:
+        get_s3_client().abort_multipart_upload(
+            Bucket=S3_BUCKET_NAME,
+            Key=object_name,
+            UploadId=upload_id
+        )
+        logger.info(f"🗑️ Aborted multipart upload for {object_name}")
+    except Exception as e:
+        logger.error(f"❌ Failed to abort multipart upload for {object_name}: {e}")
+
 def upload_to_s3_async(file_path, object_name=None, content_type=None, callback=None):
     """
-    Upload a file to S3 asynchronously in a background thread.
+    Upload a file to S3 asynchronously on the shared background pool.
     
     :param file_path: File to upload
     :param object_name: S3 object name
@@ -137,10 +346,8 @@ def upload_to_s3_async(file_path, object_name=None, content_type=None, callback=
             if callback:
                 callback(None)
     
-    thread = threading.Thread(target=async_upload)
-    thread.daemon = True
-    thread.start()
-    logger.info(f"Started async S3 upload thread for: {file_path}")
+    run_in_background(async_upload)
+    logger.info(f"Queued async S3 upload for: {file_path}")
 
 def get_content_type(file_path):
     """Determine the content type of a file based on its extension.
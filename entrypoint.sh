@@ -2,4 +2,26 @@
 echo "Checking MoviePy installation..."
 python -c "import sys; print(sys.path); from moviepy.editor import VideoFileClip; print('MoviePy imported successfully')"
 echo "Starting main application..."
-python main.py
\ No newline at end of file
+# gevent workers: requests spend most of their time waiting on MongoDB/S3/ffmpeg,
+# so each worker process multiplexes many of them as greenlets. gunicorn
+# monkey-patches the stdlib (sockets, threads, subprocess) before loading the app.
+# Set GUNICORN_WORKER_CLASS=gthread to fall back to threaded workers; --threads
+# only applies to those, gevent sizes itself with --worker-connections.
+#
+# --timeout is not a request timeout under gevent: the worker heartbeat runs on
+# the same event loop as the requests, so a worker is only killed when something
+# holds the loop without yielding for that long (CPU-bound work or a blocking call
+# that wasn't offloaded to a native thread). Slow uploads and long S3/MongoDB waits
+# yield and never trip it.
+WORKER_CLASS="${GUNICORN_WORKER_CLASS:-gevent}"
+EXTRA_ARGS=()
+if [ "$WORKER_CLASS" = "gthread" ]; then
+    EXTRA_ARGS+=(--threads "${GUNICORN_THREADS:-32}")
+fi
+exec gunicorn app:app \
+    --bind 0.0.0.0:8080 \
+    --worker-class "$WORKER_CLASS" \
+    --workers "${GUNICORN_WORKERS:-2}" \
+    --worker-connections "${GUNICORN_WORKER_CONNECTIONS:-1000}" \
+    --timeout "${GUNICORN_TIMEOUT:-120}" \
+    "${EXTRA_ARGS[@]}"